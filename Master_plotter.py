@@ -19,12 +19,16 @@ import gc
 import pyart
 from matplotlib import pyplot as plt
 from matplotlib import font_manager as ff
+from matplotlib.collections import LineCollection
 import gen_fun
 import quality_control
 import math
 import scipy.ndimage as spyi
 import time
 import colormap
+import overlay_geometry
+import radar_profiles
+import volume_cache
 
 
 
@@ -74,6 +78,33 @@ def contour_overlay(radar, sweepnum, contourField, baseField, ax, total_text, co
     return total_text
 
    
+def draw_overlays(ax, overlays):
+    """
+    DESCRIPTION: Draws all overlay lines on a figure (RHI azimuths, sector edges, range rings,
+        grid lines) as a single LineCollection, instead of one line artist per overlay line.
+    
+    INPUTS:
+    ax = The axis to draw on.
+    overlays = List of (segments, color, linewidth) tuples, where segments is an array of line
+        segments from overlay_geometry.
+    
+    OUTPUTS:
+    lines = The LineCollection added to ax, or None if there was nothing to draw.
+    """
+    segments = []
+    colors = []
+    linewidths = []
+    for group, color, linewidth in overlays:
+        segments.extend(group)
+        colors.extend([color]*len(group))
+        linewidths.extend([linewidth]*len(group))
+    if not segments:
+        return None
+    
+    lines = LineCollection(segments,colors=colors,linewidths=linewidths)
+    ax.add_collection(lines,autolim=False) #Overlays should never change the plot limits
+    return lines
+
 def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps, 
          colorbar_labels, figsize, dealias_bool, x_lim, y_lim, contour_bool, base_field, contour_field, contour_levels, azi_overlay, axis=None,
          title_flag=False,colorbar_flag = True,):
@@ -82,8 +113,9 @@ def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps
     
     INPUTS:
     radar = A python object structure that contains radar information. Created
-        by PyART in one of the pyart.io.read functions.
-    radar_type = A string describing the radar type, e.g. 'CHILL','KASPR', etc.
+        by PyART in one of the pyart.io.read functions. Can also be the path to a
+        volume cache file (see volume_cache), which is memory-mapped instead.
+    radar_type = A string naming the radar profile, e.g. 'CHILL','KASPR', etc. (see radar_profiles).
     filename = A string containing the name of the file.
     outpath = A string that specifies the full path to where the .png images
         will be saved.
@@ -118,6 +150,17 @@ def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps
     metadisp: Logical variable to control whether metatext (title, azimuth, etc.) is included in plots.
     
     """    
+    if isinstance(radar, str):
+        radar = volume_cache.read_volume(radar)
+    
+    # Start time of each sweep, read once per volume from radar.time. The time in the file name
+    # (see radar_profiles) is only used when radar.time has no reference time.
+    sweep_times = gen_fun.get_sweep_times(radar)
+    if sweep_times is None:
+        sweep_times = [radar_profiles.filename_time(radar_type, filename)]*np.size(radar.sweep_number['data'])
+    long_spacer = '     '
+    degree_sym = u'\N{DEGREE SIGN}'
+    
     for sweepnum in range(0, np.size(radar.sweep_number['data'])):
         
         if scan_strat == 'RHI':
@@ -125,6 +168,27 @@ def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps
         else:
             azi = [] #Azimuth only matters for RHI scans
         
+        # Set up metadata text to be placed in figure and in the image names, shared by every field of the sweep
+        scan_time = sweep_times[sweepnum]
+        if scan_time is not None:
+            time_text = scan_time.strftime('%Y %m %d'+long_spacer+'%H:%M:%S UTC') #YYYY MM DD      HH:MM:SS UTC
+            time_save = scan_time.strftime('.%Y%m%d-%H%M%S')
+        else:
+            time_text = filename
+            time_save = ''
+        if scan_strat == 'RHI':
+            ang_text = 'azimuth = '
+            a_text = str(round(azi,1)) #Round azimuth to 1 decimal place for title text
+        else:
+            ang_text = 'elevation = '
+            a_text = str(round(radar.fixed_angle['data'][sweepnum],2)) #Round tilt angle to 2 decimal places for title text
+        angle_text = ang_text+a_text+degree_sym
+        if (scan_strat=='Sector') or (scan_strat=='sector'):
+            sect_text = 'Sector PPI'
+            sweep_text = time_text+long_spacer+angle_text+long_spacer+sect_text
+        else:
+            sweep_text = time_text+long_spacer+angle_text+long_spacer+scan_strat
+        
         for i in range(len(fields)):
             
             field = fields[i]
@@ -153,47 +217,7 @@ def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps
             ax.set_facecolor('#CCCCCC') #Controls background color within the radar data display. Can be any Hex color code. Normal value: #CCCCCC (light gray)
                 
             try:
-#               Set up metadata text to be placed in figure (Currently implemented only for CHILL and KASPR)
-                if radar_type=='CHILL':
-                    y_text = filename[3:7]
-                    m_text = filename[7:9]
-                    d_text = filename[9:11]
-                    h_text = filename[12:14]
-                    min_text = filename[14:16]
-                    s_text = filename[16:18]
-                elif radar_type=='KASPR':
-                    y_text = filename[17:21]
-                    m_text = filename[21:23]
-                    d_text = filename[23:25]
-                    h_text = filename[26:28]
-                    min_text = filename[28:30]
-                    s_text = filename[30:32]
-                elif radar_type=='NEXRAD':
-                    y_text = filename[4:8]
-                    m_text = filename[8:10]
-                    d_text = filename[10:12]
-                    h_text = filename[13:15]
-                    min_text = filename[15:17]
-                    s_text = filename[17:19]
-                utc_text = ' UTC'
-                spacer = ' '
-                colon = ':'
-                long_spacer = '     '
-                time_text = y_text+spacer+m_text+spacer+d_text+long_spacer+h_text+colon+min_text+colon+s_text+utc_text #YYYY MM DD      HH:MM:SS UTC
-                if scan_strat == 'RHI':
-                    ang_text = 'azimuth = '
-                    a_text = str(round(azi,1)) #Round azimuth to 1 decimal place for title text
-                else:
-                    ang_text = 'elevation = '
-                    a_text = str(round(radar.fixed_angle['data'][sweepnum],2)) #Round tilt angle to 2 decimal places for title text
-
-                degree_sym = u'\N{DEGREE SIGN}'
-                angle_text = ang_text+a_text+degree_sym
-                if (scan_strat=='Sector') or (scan_strat=='sector'):
-                    sect_text = 'Sector PPI'
-                    total_text = time_text+long_spacer+angle_text+long_spacer+sect_text
-                else:
-                    total_text = time_text+long_spacer+angle_text+long_spacer+scan_strat
+                total_text = sweep_text #The contour overlay adds to the title of its own figure only
                 
                 #caption_dict controls characteristics for all meta text in the title
                 # Currently, only size is set here, but this dictionary can be used 
@@ -229,9 +253,15 @@ def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps
                             if field==base_field:
                                 total_text = contour_overlay(radar,sweepnum,contour_field,base_field,ax,total_text,contour_levels,scan_strat)
                         
+                        overlays = [] #(segments, color, linewidth) drawn together by draw_overlays
+                        
                         ## Sector scan PARTIALLY IMPLEMENTED
                         if scan_strat == 'Sector':
-                            #The edges of the sector are calculated using trigonometry
+                            #The sector edges are plotted as lines along the first and last azimuths of the sector
+                            #By default, the lines are solid and use the #105456 UNCW teal color
+                            overlays.append((overlay_geometry.sector_segments(radar.azimuth['data'],x_lim,y_lim),'#105456',7))
+                            
+                            #Offsets used to move the domain with the sector
                             azi_lim = np.asarray([min(radar.azimuth['data']),max(radar.azimuth['data'])])
                             sec_angle = np.subtract([90,90],azi_lim)
                             range_lims = np.asarray([max(x_lim),max(y_lim)])
@@ -239,11 +269,6 @@ def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps
                             trig_sec = np.array([math.cos(sec_rad[0]),math.tan(sec_rad[1])])
                             offset = np.multiply(range_lims,trig_sec)
                             
-                            #The sector edges are plotted as lines
-                            #By default, the lines are solid and use the #105456 UNCW teal color
-                            plt.plot([0,offset[0]],[0,range_lims[1]],color='#105456',linewidth=7)
-                            plt.plot([0,range_lims[0]],[0,offset[1]],color='#105456',linewidth=7)
-                            
                             #The sector edges are then used to create a domain of consistent size that moves with the sector.
                             #This is currently NOT fully functional--it assumes the range is 60km, and only works for certain sectors.
                             if (offset[0]<0) and (60+offset[1]-3>-60):
@@ -264,10 +289,14 @@ def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps
                         #Overlay RHI azimuth on the PPI scans
                         if scan_strat == 'PPI':
                             if azi_overlay['bool']:
-                                max_length = x_lim[1]
-                                x_c,y_c = gen_fun.azi_calculator(azi_overlay['azi_lines'],max_length)
-                                for iter in range(0,np.size(azi_overlay['azi_lines'])):
-                                    plt.plot([0,x_c[iter]],[0,y_c[iter]],color=azi_overlay['color'],linewidth=azi_overlay['linewidth'])
+                                overlays.append((overlay_geometry.azimuth_segments(azi_overlay['azi_lines'],x_lim,y_lim),azi_overlay['color'],azi_overlay['linewidth']))
+                        
+                        #Range rings and grid lines (optional azi_overlay keys, spacing in km)
+                        if azi_overlay.get('range_rings'):
+                            overlays.append((overlay_geometry.range_ring_segments(azi_overlay['range_rings'],x_lim,y_lim),azi_overlay.get('ring_color','k'),azi_overlay.get('ring_linewidth',1)))
+                        if azi_overlay.get('grid'):
+                            overlays.append((overlay_geometry.grid_segments(azi_overlay['grid'],x_lim,y_lim),azi_overlay.get('grid_color','k'),azi_overlay.get('grid_linewidth',0.5)))
+                        draw_overlays(ax,overlays)
                             
                         display.set_limits(ylim=y_lim)
                         display.set_limits(xlim=x_lim)
@@ -297,27 +326,27 @@ def plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps
             if scan_strat == 'RHI':
                 if metadisp==True:
                     if contour_bool==True and field==base_field:
-                        save_name = "%s%s%s.azi%d.%s.contour%s.%d.png" %(outpath, labeled, filename, azi, field, contour_field, sweepnum)
+                        save_name = "%s%s%s.azi%d.%s.contour%s.%d%s.png" %(outpath, labeled, filename, azi, field, contour_field, sweepnum, time_save)
                     else:
-                        save_name = "%s%s%s.azi%d.%s.%d.png" %(outpath, labeled, filename, azi, field, sweepnum)
+                        save_name = "%s%s%s.azi%d.%s.%d%s.png" %(outpath, labeled, filename, azi, field, sweepnum, time_save)
                 else:
                     if contour_bool==True and field==base_field:
-                        save_name = "%s%s.azi%d.%s.contour%s.%d.png" %(outpath, filename, azi, field, contour_field, sweepnum)
+                        save_name = "%s%s.azi%d.%s.contour%s.%d%s.png" %(outpath, filename, azi, field, contour_field, sweepnum, time_save)
                     else:
-                        save_name = "%s%s.azi%d.%s.%d.png" %(outpath, filename, azi, field, sweepnum)
+                        save_name = "%s%s.azi%d.%s.%d%s.png" %(outpath, filename, azi, field, sweepnum, time_save)
             else:
                 ang = 'ang'
                 a_save = ang+a_text
                 if metadisp:
                     if contour_bool == True and field == base_field:
-                        save_name = "%s%s%s.%s.contour%s.%d.%s.png" %(outpath, labeled, filename, field, contour_field, sweepnum, a_save)
+                        save_name = "%s%s%s.%s.contour%s.%d.%s%s.png" %(outpath, labeled, filename, field, contour_field, sweepnum, a_save, time_save)
                     else:
-                        save_name = "%s%s%s.%s.%d.%s.png" %(outpath, labeled, filename, field, sweepnum, a_save)
+                        save_name = "%s%s%s.%s.%d.%s%s.png" %(outpath, labeled, filename, field, sweepnum, a_save, time_save)
                 else:
                     if contour_bool==True and field==base_field:
-                        save_name = "%s%s.%s.contour%s.%d.%s.png" %(outpath, filename, field, contour_field, sweepnum, a_save)
+                        save_name = "%s%s.%s.contour%s.%d.%s%s.png" %(outpath, filename, field, contour_field, sweepnum, a_save, time_save)
                     else:
-                        save_name = "%s%s.%s.%d.%s.png" %(outpath, filename, field, sweepnum, a_save)
+                        save_name = "%s%s.%s.%d.%s%s.png" %(outpath, filename, field, sweepnum, a_save, time_save)
                
             plt.close('all')
             fig.savefig(save_name)
@@ -9,6 +9,7 @@ Utilities for reading CF/Radial files.
     :template: dev_template.rst
 
     _NetCDFVariableDataExtractor
+    _VariableGateIndex
 
 .. autosummary::
     :toctree: generated/
@@ -300,12 +301,14 @@ def read_cfradial(filename, field_names=None, additional_metadata=None,
         fields[field_name] = _ncvar_to_dict(ncvars[key], delay_field_loading)
 
     if 'ray_n_gates' in ncvars:
+        metadata['n_gates_vary'] = 'true'
         shape = (len(ncvars['time']), len(ncvars['range']))
         ray_n_gates = ncvars['ray_n_gates'][:]
         ray_start_index = ncvars['ray_start_index'][:]
+        # a single gather index is shared by all fields in the file
+        gate_index = _VariableGateIndex(shape, ray_n_gates, ray_start_index)
         for dic in fields.values():
-            _unpack_variable_gate_field_dic(
-                dic, shape, ray_n_gates, ray_start_index)
+            _unpack_variable_gate_field_dic(dic, gate_index)
 
     # 4.5 instrument_parameters sub-convention -> instrument_parameters dict
     # 4.6 radar_parameters sub-convention -> instrument_parameters dict
@@ -397,19 +400,69 @@ class _NetCDFVariableDataExtractor(object):
         return np.atleast_1d(data)
 
 
-def _unpack_variable_gate_field_dic(
-        dic, shape, ray_n_gates, ray_start_index):
+class _VariableGateIndex(object):
+    """
+    Gather index between packed n_points data and (time, range) arrays.
+
+    The index is computed once from the ray_n_gates and ray_start_index
+    variables and can be shared by all fields in a file which has a variable
+    number of gates per ray.
+
+    Parameters
+    ----------
+    shape : tuple of int
+        Shape of the unpacked (time, range) field data.
+    ray_n_gates : array
+        Number of valid gates in each ray.
+    ray_start_index : array, optional
+        Index of the first gate of each ray in the packed data. None will
+        pack the rays contiguously in ray order.
+
+    """
+
+    def __init__(self, shape, ray_n_gates, ray_start_index=None):
+        """ initialize the object. """
+        ray_n_gates = np.asarray(ray_n_gates, dtype=np.intp)
+        if ray_start_index is None:
+            ray_start_index = np.zeros_like(ray_n_gates)
+            np.cumsum(ray_n_gates[:-1], out=ray_start_index[1:])
+        else:
+            ray_start_index = np.asarray(ray_start_index, dtype=np.intp)
+        self.shape = tuple(shape)
+        self.ray_n_gates = ray_n_gates
+        self.ray_start_index = ray_start_index
+
+        gates = np.arange(self.shape[1], dtype=np.intp)
+        # gates in the (time, range) array which are present in the file
+        self.mask = gates < ray_n_gates[:, np.newaxis]
+        # location of each of those gates in the packed data
+        self.index = (ray_start_index[:, np.newaxis] + gates)[self.mask]
+        if self.index.size:
+            self.n_points = int(self.index.max()) + 1
+        else:
+            self.n_points = 0
+
+    def unpack(self, fdata):
+        """ Return a 2D masked array from 1D packed field data. """
+        data = np.ma.masked_all(self.shape, dtype=fdata.dtype)
+        data[self.mask] = fdata[self.index]
+        return data
+
+    def pack(self, data):
+        """ Return 1D packed field data from a 2D field array. """
+        fdata = np.ma.masked_all((self.n_points, ), dtype=data.dtype)
+        fdata[self.index] = data[self.mask]
+        return fdata
+
+
+def _unpack_variable_gate_field_dic(dic, gate_index):
     """ Create a 2D array from a 1D field data, dic update in place. """
-    fdata = dic['data']
-    data = np.ma.masked_all(shape, dtype=fdata.dtype)
-    for i, (gates, idx) in enumerate(zip(ray_n_gates, ray_start_index)):
-        data[i, :gates] = fdata[idx:idx+gates]
-    dic['data'] = data
+    dic['data'] = gate_index.unpack(dic['data'])
     return
 
 
 def write_cfradial(filename, radar, format='NETCDF4', time_reference=None,
-                   arm_time_variables=False):
+                   arm_time_variables=False, ray_n_gates=None):
     """
     Write a Radar object to a CF/Radial compliant netCDF file.
 
@@ -452,10 +505,21 @@ def write_cfradial(filename, radar, format='NETCDF4', time_reference=None,
     arm_time_variables : bool
         True to create the ARM standard time variables base_time and
         time_offset, False will not create these variables.
+    ray_n_gates : array, optional
+        Number of valid gates in each ray. When provided the fields are
+        written packed along the n_points dimension with the ray_n_gates and
+        ray_start_index variables, as done for files with a variable number
+        of gates per ray. None, the default, writes (time, range) fields.
 
     """
     dataset = netCDF4.Dataset(filename, 'w', format=format)
 
+    if ray_n_gates is not None:
+        gate_index = _VariableGateIndex(
+            (radar.nrays, radar.ngates), ray_n_gates)
+    else:
+        gate_index = None
+
     # determine the maximum string length
     max_str_len = len(radar.sweep_mode['data'][0])
     for k in ['follow_mode', 'prt_mode', 'polarization_mode']:
@@ -470,6 +534,8 @@ def write_cfradial(filename, radar, format='NETCDF4', time_reference=None,
     dataset.createDimension('range', radar.ngates)
     dataset.createDimension('sweep', radar.nsweeps)
     dataset.createDimension('string_length', str_len)
+    if gate_index is not None:
+        dataset.createDimension('n_points', gate_index.n_points)
 
     # global attributes
     # remove global variables from copy of metadata
@@ -492,6 +558,10 @@ def write_cfradial(filename, radar, format='NETCDF4', time_reference=None,
         t = (user, node, time_str)
         history = 'created by %s on %s at %s using Py-ART' % (t)
 
+    if gate_index is not None:
+        metadata_copy['n_gates_vary'] = 'true'
+    elif 'n_gates_vary' in metadata_copy:
+        metadata_copy['n_gates_vary'] = 'false'
     dataset.setncatts(metadata_copy)
 
     if 'Conventions' not in dataset.ncattrs():
@@ -539,8 +609,26 @@ def write_cfradial(filename, radar, format='NETCDF4', time_reference=None,
                       'antenna_transition', ('time', ))
 
     # fields
-    for field, dic in radar.fields.items():
-        _create_ncvar(dic, dataset, field, ('time', 'range'))
+    if gate_index is not None:
+        ray_n_gates_dic = {
+            'data': gate_index.ray_n_gates.astype('int32'),
+            'long_name': 'Number of gates in each ray',
+            'units': 'unitless'}
+        ray_start_index_dic = {
+            'data': gate_index.ray_start_index.astype('int32'),
+            'long_name': 'Array index to start of each ray',
+            'units': 'unitless'}
+        _create_ncvar(ray_n_gates_dic, dataset, 'ray_n_gates', ('time', ))
+        _create_ncvar(ray_start_index_dic, dataset, 'ray_start_index',
+                      ('time', ))
+        for field, dic in radar.fields.items():
+            # pack a copy so the radar field dictionary is left untouched
+            packed_dic = dict(dic)
+            packed_dic['data'] = gate_index.pack(dic['data'])
+            _create_ncvar(packed_dic, dataset, field, ('n_points', ))
+    else:
+        for field, dic in radar.fields.items():
+            _create_ncvar(dic, dataset, field, ('time', 'range'))
 
     # sweep parameters
     _create_ncvar(radar.sweep_number, dataset, 'sweep_number', ('sweep', ))
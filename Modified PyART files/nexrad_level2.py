@@ -465,7 +465,8 @@ class NEXRADLevel2File(object):
         # unambiguous range is stored in tenths of km, x100 for meters
         return self._radial_sub_array(scans, 'unambig_range') * 100.
 
-    def get_data(self, moment, max_ngates, scans=None, raw_data=False):
+    def get_data(self, moment, max_ngates, scans=None, raw_data=False,
+                 dtype='float32'):
         """
         Retrieve moment data for a given set of scans.
 
@@ -488,6 +489,9 @@ class NEXRADLevel2File(object):
         scans : list or None.
             Scans to retrieve data from (0 based).  None (the default) will
             get the data for all scans in the volume.
+        dtype : str or dtype
+            Floating point type of the scaled data, float32 by default. The
+            8 and 16-bit moments gain nothing from double precision.
 
         Returns
         -------
@@ -523,9 +527,12 @@ class NEXRADLevel2File(object):
             msg_num = self.scan_msgs[scan][0]
             msg = self.radial_records[msg_num]
             if moment in msg.keys():
-                offset = np.float32(msg[moment]['offset'])
-                scale = np.float32(msg[moment]['scale'])
-                return (np.ma.masked_less_equal(data, 1) - offset) / (scale)
+                offset = np.array(msg[moment]['offset'], dtype=dtype)
+                scale = np.array(msg[moment]['scale'], dtype=dtype)
+                mdata = np.ma.masked_less_equal(data, 1).astype(dtype)
+                mdata -= offset
+                mdata /= scale
+                return mdata
 
         # moment is not present in any scan, mask all values
         return np.ma.masked_less_equal(data, 1)
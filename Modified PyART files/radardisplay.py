@@ -16,12 +16,14 @@ Class for creating plots from Radar objects.
     1/29/2019
     
     Modified to change space used by colorbar
+    10/19/2026: plot_range_rings draws all rings as a single LineCollection
 
 """
 
 import warnings
 
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 from matplotlib.dates import DateFormatter
 import numpy as np
 import netCDF4
@@ -827,9 +829,16 @@ class RadarDisplay(object):
             Linestyle to use for range rings.
 
         """
-        for range_ring_location_km in range_rings:
-            self.plot_range_ring(
-                range_ring_location_km, ax=ax, col=col, ls=ls, lw=lw)
+        # All rings are drawn as one LineCollection rather than one line
+        # per ring, which keeps the artist count (and draw time) constant.
+        ax = common.parse_ax(ax)
+        npts = 100
+        theta = np.linspace(0, 2 * np.pi, npts)
+        r = np.asarray(range_rings, dtype=np.float32)[:, np.newaxis]
+        rings = np.stack([r * np.sin(theta), r * np.cos(theta)], axis=-1)
+        ax.add_collection(LineCollection(
+            rings, colors=col, linestyles=ls, linewidths=lw))
+        ax.autoscale_view()
 
     @staticmethod
     def plot_range_ring(
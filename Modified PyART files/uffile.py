@@ -181,8 +181,13 @@ class UFFile(object):
             last_ray_in_sweep[i] = matches[0][-1]
         return first_ray_in_sweep, last_ray_in_sweep
 
-    def get_field_data(self, field_number):
-        """ Return a 2D array of scale/masked field data for the volume. """
+    def get_field_data(self, field_number, dtype='float32'):
+        """
+        Return a 2D array of scale/masked field data for the volume.
+
+        The data is returned as dtype, float32 by default, which is ample for
+        16-bit UF data and half the size of float64.
+        """
         # Assumes that no rays contain more gates than the first ray and
         # that the missing_data_value and scale_factor are identical for all
         # rays.  Additional the order and number of the fields are assumed to
@@ -199,7 +204,8 @@ class UFFile(object):
             raw_data[i, :bins] = ray.field_raw_data[field_number]
             raw_data[i, bins:] = missing_data_value
 
-        data = raw_data / float(scale_factor)
+        data = raw_data.astype(dtype)
+        data /= np.array(scale_factor, dtype=dtype)
         mask = raw_data == missing_data_value
         return np.ma.masked_array(data, mask)
 
@@ -5,8 +5,23 @@ Created on Fri Dec  7 12:35:27 2018
 DESCRIPTION: Functions to derive fields from existing observations and add them to the radar object.
 Contains:
     rasmussen_snow_rate
+    snow_rate_field
+    precip_rate
+    precip_rate_field
+    power_law_rate
+    kdp_lsq
+    kdp_lsq_field
+    sliding_lsq_slope
+    window_sum
+    eddy_dissipation_rate
+    eddy_dissipation_rate_field
     kdp_derivative
+    kdp_derivative_field
     velocity_vertical_divergence
+    velocity_vertical_divergence_field
+
+The *_field functions return the new field dictionary without changing the radar object or the list
+of field names; derived_fields uses them to compute fields only when they are needed.
 
 @author: danielholt
 
@@ -20,16 +35,26 @@ Undergraduate Research Assistant at Environment Analytics
 import pyart
 import numpy as np
 import string
+import precision
+import quality_control
+
+# Power law relations Z = a*R**b between reflectivity Z (mm^6 m^-3) and precipitation rate R (mm/hr,
+# liquid equivalent for snow), stored as (a, b). Select one by name in precip_rate, or pass (a, b) directly.
+ZR_RELATIONS = {
+        'rasmussen_snow': (57.3, 1.67), #Rasmussen et al. (2003) wet snow, see rasmussen_snow_rate
+        'marshall_palmer': (200., 1.6), #Stratiform rain
+        'wsr88d_convective': (300., 1.4), #WSR-88D default
+        'rosenfeld_tropical': (250., 1.2), #Tropical convective rain
+        }
 
 def rasmussen_snow_rate(radar, radar_fieldnames):
     """
     DESCRIPTION: Calculates the Rasmussen snow rate from a given reflectivity field,
     then adds said field to the radar object.
     
-    NOTE THAT THE NEW SNOW RATE FIELD IS NOT FORMATTED EXACTLY THE SAME AS A NORMAL PYART DATA FIELD
-    PyART data fields are by default masked arrays with a data, mask, and fill_value component. The new 
-    snow rate field will simply be an array.
-    
+    As in earlier versions of this toolkit, the relation is applied directly to the reflectivity in dBZ
+    (a rescaled reflectivity) rather than to linear Z. Gates with negative reflectivity have a snow rate
+    of 0. Use precip_rate for relations applied to linear Z.
     
     INPUTS:
     radar = A python object structure that contains radar information. Created
@@ -40,9 +65,6 @@ def rasmussen_snow_rate(radar, radar_fieldnames):
     radar = The original radar object but with snow rate added.
         
     """
-    
-    reflectivity = radar.fields['reflectivity']['data'].data
-    
     #Calculate the Rasmussen snow rate
     #This is the "wet snow" calculation
     #For details, see:
@@ -51,19 +73,325 @@ def rasmussen_snow_rate(radar, radar_fieldnames):
     #   42 pp 20-36
     #Hoban, Nicole (2016) Observed Characteristics of Mesoscale Banding in Coastal Northeast U.S. Snow Storms. Unpublished
     #   Master's Thesis. North Carolina State University.
-    divstep = np.divide(reflectivity,57.3)
-    changetype = np.array(divstep,dtype = np.complex)
-    rootstep = np.power(changetype,1/1.67)
-    snow_rate = np.real(rootstep)
-    
-    snow_rate = np.array(snow_rate)
-    
-    radar.add_field_like('reflectivity','snow_rate',snow_rate,replace_existing=False)
+    radar.add_field('snow_rate', snow_rate_field(radar), replace_existing=False)
     radar_fieldnames.append('snow_rate')
     
     return radar
     return radar_fieldnames
 
+def snow_rate_field(radar):
+    """
+    DESCRIPTION: Returns the Rasmussen snow rate field dictionary without adding it to the radar object.
+    See rasmussen_snow_rate. Used by derived_fields.
+    """
+    snow_rate = power_law_rate(radar.fields['reflectivity']['data'], ZR_RELATIONS['rasmussen_snow'], linear_z=False)
+    return _rate_field(radar, snow_rate, 'Rasmussen snow rate')
+
+def precip_rate(radar, radar_fieldnames, relation='marshall_palmer', field_name='precip_rate'):
+    """
+    DESCRIPTION: Calculates a precipitation rate from the reflectivity field with a Z-R (or Z-S) power law,
+    then adds said field to the radar object.
+    
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    radar_fieldnames = names of fields in the radar object
+    
+    OPTIONAL INPUTS:
+    relation = Default set to 'marshall_palmer'. Name of a relation in ZR_RELATIONS, or a tuple of
+        coefficients (a, b) for Z = a*R**b.
+    field_name = Default set to 'precip_rate'. Name of the new field.
+    
+    OUTPUTS:
+    radar = The original radar object but with the precipitation rate added.
+        
+    """
+    radar.add_field(field_name, precip_rate_field(radar, relation), replace_existing=False)
+    radar_fieldnames.append(field_name)
+    
+    return radar
+
+def precip_rate_field(radar, relation='marshall_palmer'):
+    """
+    DESCRIPTION: Returns the precipitation rate field dictionary without adding it to the radar object.
+    See precip_rate. Used by derived_fields.
+    """
+    if isinstance(relation, str):
+        long_name = 'Precipitation rate (%s)' % relation
+        relation = ZR_RELATIONS[relation]
+    else:
+        long_name = 'Precipitation rate (Z = %gR^%g)' % tuple(relation)
+    rate = power_law_rate(radar.fields['reflectivity']['data'], relation)
+    return _rate_field(radar, rate, long_name)
+
+def power_law_rate(reflectivity, relation, linear_z=True):
+    """
+    DESCRIPTION: Inverts the power law Z = a*R**b for every gate in a single pass, without
+    temporary complex arrays.
+    
+    INPUTS:
+    reflectivity = Reflectivity in dBZ. Array or masked array.
+    relation = Tuple of coefficients (a, b), e.g. ZR_RELATIONS['marshall_palmer'].
+    
+    OPTIONAL INPUTS:
+    linear_z = Default set to True. If True, dBZ is converted to linear Z first (the usual Z-R
+        relation), computed as R = exp(dBZ*ln(10)/(10*b) - ln(a)/b). If False, the relation is
+        applied to the dBZ values themselves (rescaled reflectivity) and negative values give 0.
+        
+    OUTPUTS:
+    rate = Masked array of rates in FIELD_DTYPE. Gates that are masked or not finite in the
+        input are masked.
+        
+    """
+    a, b = relation
+    dtype = precision.FIELD_DTYPE
+    data = np.ma.getdata(reflectivity)
+    
+    rate = np.array(data, dtype=dtype) #The one full-size allocation; everything below is in place
+    if linear_z:
+        rate *= dtype(np.log(10)/(10*b))
+        rate -= dtype(np.log(a)/b)
+        np.exp(rate, out=rate)
+    else:
+        np.maximum(rate, 0, out=rate)
+        rate *= dtype(1/a)
+        np.power(rate, dtype(1/b), out=rate)
+    
+    mask = np.ma.getmaskarray(reflectivity) | ~np.isfinite(rate)
+    return np.ma.MaskedArray(rate, mask=mask, copy=False)
+
+def _field_like(radar, template_field, data):
+    """
+    DESCRIPTION: Builds a field dictionary with the metadata of an existing field, like
+    radar.add_field_like does, without adding it to the radar object.
+    """
+    dic = dict((key, value) for key, value in radar.fields[template_field].items() if key != 'data')
+    dic['data'] = data
+    return dic
+
+def _rate_field(radar, rate, long_name):
+    """
+    DESCRIPTION: Builds a PyART field dictionary for a precipitation rate field.
+    """
+    dic = {'data': rate,
+           'units': 'mm/hr',
+           'long_name': long_name,
+           '_FillValue': np.ma.default_fill_value(rate)}
+    if 'coordinates' in radar.fields['reflectivity']:
+        dic['coordinates'] = radar.fields['reflectivity']['coordinates']
+    return dic
+
+# PhiDP field names used by the supported radars, in order of preference
+PHIDP_FIELDS = ('differential_phase', 'one_way_differential_phase')
+ONE_WAY_PHIDP_FIELDS = ('one_way_differential_phase',) #CHILL's DP; Kdp is the whole slope of these
+
+def kdp_lsq(radar, radar_fieldnames, window_km=2.5, min_valid=0.5):
+    """
+    DESCRIPTION: Estimates the specific differential phase (Kdp) as the least-squares slope of PhiDP
+    along range, then adds said field ('kdp_lsq') to the radar object.
+    
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    radar_fieldnames = names of fields in the radar object
+    
+    OPTIONAL INPUTS:
+    window_km = Default set to 2.5. Length of the sliding range window in km.
+    min_valid = Default set to 0.5. Fraction of the gates in a window that must have valid PhiDP.
+    
+    OUTPUTS:
+    radar = The original radar object, with Kdp added.
+        
+    """
+    radar.add_field('kdp_lsq', kdp_lsq_field(radar, window_km, min_valid), replace_existing=False)
+    radar_fieldnames.append('kdp_lsq')
+    
+    return radar
+
+def kdp_lsq_field(radar, window_km=2.5, min_valid=0.5):
+    """
+    DESCRIPTION: Returns the least-squares Kdp field dictionary without adding it to the radar object.
+    See kdp_lsq. Used by derived_fields.
+    
+    PhiDP is first unfolded along each ray (jumps of more than 180 degrees between valid gates are
+    treated as wraps), then fit with a straight line in a sliding window centered on each gate. The
+    window sums are taken from cumulative sums, so the cost does not depend on the window length.
+    Kdp is half the slope of a two-way PhiDP ('differential_phase'), and the whole slope of a one-way
+    PhiDP (ONE_WAY_PHIDP_FIELDS, e.g. CHILL's 'one_way_differential_phase'). Gates with invalid PhiDP,
+    or whose window has too few valid gates, are masked.
+    """
+    phidp_name = [name for name in PHIDP_FIELDS if name in radar.fields][0]
+    phidp = radar.fields[phidp_name]['data']
+    valid = ~np.ma.getmaskarray(phidp) & np.isfinite(np.ma.getdata(phidp))
+    
+    # Hold the last valid value across bad gates, so they neither add wraps nor break the unfolding
+    gate = np.arange(valid.shape[1])
+    last_valid = np.maximum.accumulate(np.where(valid, gate, 0), axis=1)
+    held = np.take_along_axis(np.where(valid, np.ma.getdata(phidp), 0).astype(np.float64), last_valid, axis=1)
+    step = np.diff(held, axis=1)
+    step -= 360*np.round(step/360)
+    unfolded = np.concatenate([held[:, :1], held[:, :1] + np.cumsum(step, axis=1)], axis=1)
+    
+    gate_km = np.median(np.diff(radar.range['data']))/1000.
+    half = max(int(round(window_km/gate_km/2)), 1)
+    slope, count = sliding_lsq_slope(unfolded, valid, half)
+    
+    passes = 1 if phidp_name in ONE_WAY_PHIDP_FIELDS else 2
+    kdp = (slope/(passes*gate_km)).astype(precision.FIELD_DTYPE)
+    mask = ~valid | (count < min_valid*(2*half + 1)) | ~np.isfinite(kdp)
+    
+    return {'data': np.ma.MaskedArray(kdp, mask=mask, copy=False),
+            'units': 'degrees/km',
+            'long_name': 'Specific differential phase (least-squares estimate)',
+            '_FillValue': np.ma.default_fill_value(kdp),
+            'coordinates': radar.fields[phidp_name].get('coordinates', 'elevation azimuth range')}
+
+def sliding_lsq_slope(y, valid, half):
+    """
+    DESCRIPTION: Least-squares slope of y against gate number in a window of 2*half+1 gates centered
+    on each gate, for every ray at once. Only valid gates are used in each fit. Windows are cut
+    short at the ends of the ray.
+    
+    INPUTS:
+    y = 2-D array (rays x gates).
+    valid = Boolean array of the same shape, True where y can be used.
+    half = Number of gates on each side of the center gate.
+    
+    OUTPUTS:
+    slope = Slope in units of y per gate (NaN where fewer than 2 valid gates).
+    count = Number of valid gates in each window.
+        
+    """
+    w = valid.astype(np.float64)
+    x = np.arange(y.shape[1], dtype=np.float64) - y.shape[1]/2. #Centered to keep the sums small
+    y_mean = np.sum(np.where(valid, y, 0), axis=1, keepdims=True)/np.maximum(w.sum(axis=1, keepdims=True), 1)
+    y = np.where(valid, y - y_mean, 0) #Same for y
+    
+    count = window_sum(w, half)
+    sum_x = window_sum(w*x, half)
+    sum_y = window_sum(y, half)
+    sum_xx = window_sum(w*x*x, half)
+    sum_xy = window_sum(x*y, half)
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = (count*sum_xy - sum_x*sum_y)/(count*sum_xx - sum_x**2)
+    slope[count < 2] = np.nan
+    return slope, count
+
+def window_sum(a, half):
+    """
+    DESCRIPTION: Sum of a over a window of 2*half+1 gates centered on each gate along the last axis,
+    computed from one cumulative sum. Windows are cut short at the ends of the ray.
+    
+    INPUTS:
+    a = Array (rays x gates).
+    half = Number of gates on each side of the center gate.
+    
+    OUTPUTS:
+    total = Array of the same shape as a.
+        
+    """
+    csum = np.zeros(a.shape[:-1] + (a.shape[-1] + 1,))
+    np.cumsum(a, axis=-1, out=csum[..., 1:])
+    gate = np.arange(a.shape[-1])
+    upper = np.minimum(gate + half + 1, a.shape[-1])
+    lower = np.maximum(gate - half, 0)
+    total = csum[..., upper] - csum[..., lower]
+    return total
+
+# Spectrum width field names used by the supported radars, in order of preference
+WIDTH_FIELDS = ('spectrum_width', 'SW', 'WIDTH')
+KOLMOGOROV_CONSTANT = 1.6
+
+def eddy_dissipation_rate(radar, radar_fieldnames, **kwargs):
+    """
+    DESCRIPTION: Retrieves the eddy dissipation rate (EDR, the cube root of the turbulent kinetic energy
+    dissipation rate) from spectrum width, then adds said field ('edr') to the radar object.
+    
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    radar_fieldnames = names of fields in the radar object
+    
+    OPTIONAL INPUTS:
+    kwargs = Settings passed to eddy_dissipation_rate_field.
+    
+    OUTPUTS:
+    radar = The original radar object, with EDR added.
+        
+    """
+    radar.add_field('edr', eddy_dissipation_rate_field(radar, **kwargs), replace_existing=False)
+    radar_fieldnames.append('edr')
+    
+    return radar
+
+def eddy_dissipation_rate_field(radar, beamwidth=None, half_rays=1, half_gates=2, other_width=0.,
+                                min_valid=0.5, threads=1):
+    """
+    DESCRIPTION: Returns the EDR field dictionary without adding it to the radar object.
+    See eddy_dissipation_rate. Used by derived_fields.
+    
+    The squared spectrum width is averaged in a moving window over rays and gates (integral images,
+    so the cost per gate does not depend on the window size), then converted with the inertial
+    subrange relation for a beam much wider than the range resolution (Doviak and Zrnic 1993,
+    eq. 10.64): width^2 = 1.35*A*(eps*sigma)^(2/3), where A is the Kolmogorov constant and
+    sigma = range*beamwidth/(4*sqrt(ln 2)) is the transverse size of the beam. Sweeps are
+    independent, so they can be processed on several threads.
+    
+    OPTIONAL INPUTS:
+    beamwidth = Default set to None, which uses the radar's instrument parameters (1 degree if
+        they are missing). Half-power beamwidth in degrees.
+    half_rays = Default set to 1. Window half-size in rays.
+    half_gates = Default set to 2. Window half-size in gates.
+    other_width = Default set to 0. Spectrum width (m/s) from sources other than turbulence
+        (e.g. antenna rotation, shear) removed before the conversion.
+    min_valid = Default set to 0.5. Fraction of the gates in a window that must have valid width.
+    threads = Default set to 1. Number of threads used to process the sweeps.
+    """
+    width_name = [name for name in WIDTH_FIELDS if name in radar.fields][0]
+    width = radar.fields[width_name]['data']
+    valid = ~np.ma.getmaskarray(width) & np.isfinite(np.ma.getdata(width))
+    width_sq = np.ma.getdata(width).astype(np.float64)**2
+    
+    if beamwidth is None:
+        try:
+            beamwidth = float(radar.instrument_parameters['radar_beam_width_h']['data'][0])
+        except (KeyError, TypeError, IndexError):
+            beamwidth = 1.
+    beam_sigma = radar.range['data']*np.deg2rad(beamwidth)/(4*np.sqrt(np.log(2))) #m
+    
+    mean_sq = np.full(width_sq.shape, np.nan)
+    enough = np.zeros(width_sq.shape, dtype=bool)
+    window = (2*half_rays + 1)*(2*half_gates + 1)
+    wrap = radar.scan_type == 'ppi'
+    sweeps = [slice(start, end + 1) for start, end in
+              zip(radar.sweep_start_ray_index['data'], radar.sweep_end_ray_index['data'])]
+    
+    def process_sweep(sweep):
+        mean, var, count = quality_control.window_stats(width_sq[sweep], valid[sweep], half_rays, half_gates, wrap)
+        mean_sq[sweep] = mean
+        enough[sweep] = count >= min_valid*window
+    
+    if threads > 1:
+        from concurrent.futures import ThreadPoolExecutor #Numpy releases the GIL for the window sums
+        with ThreadPoolExecutor(threads) as executor:
+            list(executor.map(process_sweep, sweeps))
+    else:
+        for sweep in sweeps:
+            process_sweep(sweep)
+    
+    turbulent_sq = np.maximum(mean_sq - other_width**2, 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eps = (turbulent_sq/(1.35*KOLMOGOROV_CONSTANT))**1.5/beam_sigma[np.newaxis, :]
+    edr = np.cbrt(eps).astype(precision.FIELD_DTYPE)
+    mask = ~valid | ~enough | ~np.isfinite(edr)
+    
+    return {'data': np.ma.MaskedArray(edr, mask=mask, copy=False),
+            'units': 'm^(2/3) s^-1',
+            'long_name': 'Eddy dissipation rate (cube root of turbulent kinetic energy dissipation rate)',
+            '_FillValue': np.ma.default_fill_value(edr),
+            'coordinates': radar.fields[width_name].get('coordinates', 'elevation azimuth range')}
+
 def kdp_derivative(radar, radar_fieldnames):
     """
     DESCRIPTION: Calculates the derivative of the two-way differential phase (Kdp)
@@ -85,7 +413,18 @@ def kdp_derivative(radar, radar_fieldnames):
         specified field.
         
     """
-    phidp = radar.fields['specific_differential_phase']['data'].data
+    radar.add_field('kdp', kdp_derivative_field(radar), replace_existing=False)
+    radar_fieldnames.append('kdp')
+    
+    return radar
+    return radar_fieldnames
+
+def kdp_derivative_field(radar):
+    """
+    DESCRIPTION: Returns the Kdp derivative field dictionary without adding it to the radar object.
+    See kdp_derivative. Used by derived_fields.
+    """
+    phidp = precision.as_field_dtype(radar.fields['specific_differential_phase']['data'].data)
     
     kdp = np.diff(phidp)
     # This will now have a size -1 columns, as it is a difference of the original.
@@ -93,23 +432,17 @@ def kdp_derivative(radar, radar_fieldnames):
     # Hence, it must be padded.
     kdp = np.pad(kdp,[(0,0),(0,1)],'constant',constant_values=(np.nan))
     
-    
-    radar.add_field_like('reflectivity','kdp',kdp,replace_existing=False)
-    radar_fieldnames.append('kdp')
-    
-    return radar
-    return radar_fieldnames
+    return _field_like(radar, 'reflectivity', kdp)
 
 def velocity_vertical_divergence(radar, radar_fieldnames):
     """
-    DESCRIPTION: Calculates the vertical divergence of horizontal velocity; basically the gate-by-gate vertical shear.
+    DESCRIPTION: Calculates the vertical divergence of horizontal velocity; basically the vertical shear
+    |dV/dz| of dealiased velocity between vertically neighbouring gates, in (m/s)/km. Heights come from
+    the radar's gate_z coordinates, so the spacing between gates is accounted for. For RHI scans the
+    neighbours are the rays at the next higher elevation in the same sweep; for PPI volumes they are the nearest-azimuth ray in
+    the next higher tilt with velocity data, at the same gate number.
     This field is referred to as "vdiv" for short.
     
-    NOTE THAT THE NEW VDIV FIELD IS NOT FORMATTED EXACTLY THE SAME AS A NORMAL PYART DATA FIELD
-    PyART data fields are by default masked arrays with a data, mask, and fill_value component. The new 
-    vdiv field will simply be an array.
-    
-    
     INPUTS:
     radar = A python object structure that contains radar information. Created
         by PyART in one of the pyart.io.read functions.
@@ -118,24 +451,101 @@ def velocity_vertical_divergence(radar, radar_fieldnames):
     OUTPUTS:
     radar = The original radar object, with vdiv added.
         
+    """
+    radar.add_field('vdiv', velocity_vertical_divergence_field(radar), replace_existing=False)
+    radar_fieldnames.append('vdiv')
+    
+    return radar
+    return radar_fieldnames
+
+def velocity_vertical_divergence_field(radar):
+    """
+    DESCRIPTION: Returns the vdiv field dictionary without adding it to the radar object.
+    See velocity_vertical_divergence. Used by derived_fields.
+    
+    Each gate gets the shear to the gate above it. Gates with no gate above them (highest ray of an RHI
+    sweep, the top tilt of a PPI volume), invalid velocity at either gate, or a gate above that is not
+    higher are masked.
     """
     try:
-        vdiv = radar.fields['dealiased_velocity']['data'].data
+        velocity = radar.fields['dealiased_velocity']['data']
     except KeyError:
-        vdiv = radar.fields['PyART_dealiased_velocity']['data'].data
+        velocity = radar.fields['PyART_dealiased_velocity']['data']
     
-    # Take the derivative with respect to height
-    vdiv = np.diff(vdiv,n=1,axis=0) #Python matrices start at 0
-    # Pad the matrix to replace the missing row
-    vdiv = np.pad(vdiv,[(0,1),(0,0)],'constant',constant_values=(np.nan))
-    vdiv = np.abs(vdiv)
+    valid = ~np.ma.getmaskarray(velocity) & np.isfinite(np.ma.getdata(velocity))
+    velocity = precision.as_field_dtype(np.ma.getdata(velocity))
+    height = radar.gate_z['data'] #Computed once per radar object and kept by PyART
     
-    radar.add_field_like('reflectivity','vdiv',vdiv,replace_existing=False)
-    radar_fieldnames.append('vdiv')
+    upper = _upper_rays(radar, valid)
+    has_upper = upper >= 0
+    upper = np.where(has_upper, upper, np.arange(upper.size))
     
-    return radar
-    return radar_fieldnames
+    dz = (height[upper] - height)/1000. #km
+    dv = velocity[upper] - velocity
+    mask = ~(valid & valid[upper] & (dz > 0) & has_upper[:, np.newaxis])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vdiv = np.abs(dv/dz).astype(precision.FIELD_DTYPE)
+    
+    return {'data': np.ma.MaskedArray(vdiv, mask=mask, copy=False),
+            'units': 'meters_per_second_per_km',
+            'long_name': 'Absolute vertical shear of dealiased velocity',
+            '_FillValue': np.ma.default_fill_value(vdiv),
+            'coordinates': 'elevation azimuth range'}
+
+def _upper_rays(radar, valid):
+    """
+    DESCRIPTION: Returns, for every ray, the index of the ray vertically above it (-1 if none). RHI
+    sweeps pair each ray with the ray of the same sweep at the next higher elevation, whichever way
+    the antenna moved; rays past 90 degrees are paired on their own side of the zenith. Other scans
+    pair each ray with the nearest-azimuth ray of the next higher tilt (by fixed angle) that has valid
+    velocity, so repeated tilts (NEXRAD split cuts, SAILS) and sweep order do not matter. When a tilt
+    was scanned more than once, the sweep with the most valid velocity gates is used.
+    """
+    starts = radar.sweep_start_ray_index['data']
+    ends = radar.sweep_end_ray_index['data']
+    upper = np.full(radar.nrays, -1, dtype=np.intp)
     
+    if radar.scan_type == 'rhi':
+        elevation = np.asarray(radar.elevation['data'], dtype=float)
+        for start, end in zip(starts, ends):
+            rays = np.arange(start, end + 1)
+            beyond = elevation[rays] > 90
+            for side in (rays[~beyond], rays[beyond]):
+                # Angle above the horizon on this side of the zenith
+                angle = np.where(elevation[side] > 90, 180 - elevation[side], elevation[side])
+                order = np.argsort(angle, kind='stable')
+                above = np.searchsorted(angle[order], angle, side='right')
+                has_above = above < side.size
+                upper[side[has_above]] = side[order[above[has_above]]]
+        return upper
     
+    tilts = np.asarray(radar.fixed_angle['data'], dtype=float)
+    counts = np.array([valid[start:end + 1].sum() for start, end in zip(starts, ends)])
+    for sweep, (start, end) in enumerate(zip(starts, ends)):
+        if not np.isfinite(tilts[sweep]):
+            tilts[sweep] = np.median(radar.elevation['data'][start:end + 1])
+    tilts = np.round(tilts, 2)
+    # Best sweep of each distinct tilt that has velocity
+    best = {}
+    for sweep in np.flatnonzero(counts > 0):
+        if tilts[sweep] not in best or counts[sweep] > counts[best[tilts[sweep]]]:
+            best[tilts[sweep]] = sweep
+    levels = sorted(best)
     
-    
\ No newline at end of file
+    azimuth = np.mod(radar.azimuth['data'], 360)
+    for sweep in range(len(starts)):
+        higher = [level for level in levels if level > tilts[sweep]]
+        if not higher:
+            continue
+        next_sweep = best[higher[0]]
+        rays = np.arange(starts[sweep], ends[sweep] + 1)
+        above = np.arange(starts[next_sweep], ends[next_sweep] + 1)
+        order = np.argsort(azimuth[above])
+        above_azi = azimuth[above][order]
+        # Neighbours on either side in the sorted azimuths, wrapping around north
+        right = np.searchsorted(above_azi, azimuth[rays]) % above_azi.size
+        left = (right - 1) % above_azi.size
+        right_gap = np.abs((above_azi[right] - azimuth[rays] + 180) % 360 - 180)
+        left_gap = np.abs((azimuth[rays] - above_azi[left] + 180) % 360 - 180)
+        upper[rays] = above[order[np.where(left_gap < right_gap, left, right)]]
+    return upper
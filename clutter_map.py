@@ -0,0 +1,333 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Persistent static clutter map for a fixed radar site. Mountain and building clutter
+(e.g. at CHILL or KCYS) shows up at the same places in nearly every volume, so instead of finding
+it from scratch each time, this module keeps count of how often each (tilt, azimuth bin, range gate)
+is flagged by quality_control.classify_clutter. The counts are updated one volume at a time as new
+files arrive, saved to disk, and turned into a clutter mask for any volume with a single indexing
+operation.
+Contains:
+    new_map
+    load
+    load_cached
+    save
+    update
+    update_saved
+    update_from_files
+    get_mask
+
+MAP LAYOUT:
+    The map is a dictionary holding two uint16 arrays of shape (tilts, azimuth bins, gates): 'hits'
+    (volumes in which the cell was clutter) and 'visits' (volumes that observed the cell), along with
+    the tilt angles, the range gate geometry, and the times of the last RECENT_VOLUMES volumes counted
+    on each tilt. For RHI
+    scans the roles are swapped: the "tilt" is the RHI azimuth and the bins are in elevation.
+    The file uses the volume_cache container format (JSON header followed by raw arrays).
+
+Version date: 10/19/2026
+"""
+
+import datetime
+import os
+import time
+from contextlib import contextmanager
+import numpy as np
+import pyart
+import quality_control
+import volume_cache
+
+MAP_VERSION = 2
+TILT_DECIMALS = 1 #Tilts within 0.05 degrees of each other share a map
+_LOADED = {} #filename: (modification time, map), see load_cached
+RECENT_VOLUMES = 100 #Volume times remembered per tilt, see update
+STALE_LOCK = 300 #Seconds after which a lock file left by a crashed process is removed
+
+def new_map(scan_type, first_gate, gate_spacing, ngates, azimuth_bins=360):
+    """
+    DESCRIPTION: Creates an empty clutter map.
+
+    INPUTS:
+    scan_type = 'ppi' or 'rhi'.
+    first_gate = Range of the first gate in meters.
+    gate_spacing = Distance between gates in meters.
+    ngates = Number of range gates to keep.
+
+    OPTIONAL INPUTS:
+    azimuth_bins = Default set to 360. Number of angle bins per tilt (360 gives 1 degree bins for PPIs).
+
+    OUTPUTS:
+    clutter_map = Dictionary holding the map.
+    """
+    clutter_map = {'version': MAP_VERSION, 'scan_type': scan_type, 'first_gate': float(first_gate),
+                   'gate_spacing': float(gate_spacing), 'azimuth_bins': int(azimuth_bins),
+                   'tilts': [], 'recent_times': [],
+                   'hits': np.zeros((0, azimuth_bins, ngates), dtype=np.uint16),
+                   'visits': np.zeros((0, azimuth_bins, ngates), dtype=np.uint16)}
+    return clutter_map
+
+def load(filename):
+    """
+    DESCRIPTION: Loads a clutter map saved with save.
+
+    INPUTS:
+    filename = Full path of the map file.
+
+    OUTPUTS:
+    clutter_map = Dictionary holding the map, or None if the file does not exist.
+    """
+    if not os.path.isfile(filename):
+        return None
+    header, blocks = volume_cache.read_container(filename, mmap=False)
+    clutter_map = dict(header)
+    del clutter_map['blocks']
+    if 'recent_times' not in clutter_map:
+        # Version 1 maps listed every file counted instead
+        clutter_map['recent_times'] = [[] for tilt in clutter_map['tilts']]
+        clutter_map.pop('files', None)
+        clutter_map['version'] = MAP_VERSION
+    clutter_map['hits'] = blocks[0]
+    clutter_map['visits'] = blocks[1]
+    return clutter_map
+
+def load_cached(filename):
+    """
+    DESCRIPTION: Same as load, but keeps the map in memory for the rest of the process and only
+        reads the file again after it changes. Used when the map is applied to every volume.
+    """
+    if not os.path.isfile(filename):
+        return None
+    mtime = os.path.getmtime(filename)
+    cached = _LOADED.get(filename)
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, load(filename))
+        _LOADED[filename] = cached
+    return cached[1]
+
+def save(clutter_map, filename):
+    """
+    DESCRIPTION: Saves a clutter map. The file is replaced in one step, so a process reading the map
+        never sees a partial file.
+
+    INPUTS:
+    clutter_map = Dictionary holding the map.
+    filename = Full path of the map file.
+
+    OUTPUTS:
+    The saved map file.
+    """
+    header = dict((key, value) for key, value in clutter_map.items() if key not in ('hits', 'visits'))
+    volume_cache.write_container(filename, header, [clutter_map['hits'], clutter_map['visits']])
+
+def update(clutter_map, radar, **kwargs):
+    """
+    DESCRIPTION: Adds one volume to the map.
+
+    INPUTS:
+    clutter_map = Dictionary holding the map (see new_map). Pass None to start a new map with the
+        geometry of this radar.
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+
+    OPTIONAL INPUTS:
+    kwargs = Thresholds passed to quality_control.classify_clutter.
+
+    The times of the last RECENT_VOLUMES volumes counted on each tilt are kept, and a tilt is skipped
+    if this volume's time is among them or older than all of them. A file fed to the map twice is
+    therefore counted once, while volumes may arrive out of order (e.g. from several workers).
+
+    OUTPUTS:
+    clutter_map = The updated map.
+    """
+    if clutter_map is None:
+        rng = radar.range['data']
+        clutter_map = new_map(radar.scan_type, rng[0], np.median(np.diff(rng)), rng.size)
+    volume_time = (pyart.util.datetime_from_radar(radar) - datetime.datetime(1970, 1, 1)).total_seconds()
+    tilt, angle_bin, gate, in_map = _cells(clutter_map, radar, add_tilts=True)
+    recent_times = clutter_map['recent_times']
+    fresh = [index for index, times in enumerate(recent_times) if volume_time not in times
+             and (len(times) < RECENT_VOLUMES or volume_time > times[0])]
+    counted = np.isin(tilt, fresh)
+    if not counted.any():
+        return clutter_map
+    clutter = quality_control.classify_clutter(radar, **kwargs)
+
+    shape = clutter_map['hits'].shape
+    cell = np.ravel_multi_index((tilt[:, np.newaxis], angle_bin[:, np.newaxis], gate[np.newaxis, :]), shape)
+    inside = in_map[np.newaxis, :] & counted[:, np.newaxis]
+    # A volume counts once per cell, even when several of its rays fall in the same angle bin
+    visited = np.zeros(int(np.prod(shape)), dtype=bool)
+    visited[cell[inside]] = True
+    flagged = np.zeros(int(np.prod(shape)), dtype=bool)
+    flagged[cell[inside & clutter]] = True
+
+    visits = clutter_map['visits'].reshape(-1)
+    hits = clutter_map['hits'].reshape(-1)
+    if visits.max(initial=0) == np.iinfo(np.uint16).max:
+        # Halve the counts rather than overflow; keeps the clutter fraction and favours recent volumes
+        visits //= 2
+        hits //= 2
+    visits += visited
+    hits += flagged
+    for index in np.unique(tilt[counted]):
+        recent_times[index] = sorted(recent_times[index] + [volume_time])[-RECENT_VOLUMES:]
+    return clutter_map
+
+def update_saved(filename, radar, timeout=60, **kwargs):
+    """
+    DESCRIPTION: Adds one volume to the map saved in filename (creating it if needed) and saves it.
+        The load, update, and save are done while holding a lock file (filename + '.lock'), so
+        several worker processes can update the same map without losing each other's counts.
+
+    INPUTS:
+    filename = Full path of the map file.
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+
+    OPTIONAL INPUTS:
+    timeout = Default set to 60. Seconds to wait for the lock before giving up with TimeoutError.
+    kwargs = Thresholds passed to quality_control.classify_clutter.
+
+    OUTPUTS:
+    clutter_map = The updated map, which is also saved to filename.
+    """
+    with _locked(filename + '.lock', timeout):
+        clutter_map = update(load(filename), radar, **kwargs)
+        save(clutter_map, filename)
+    return clutter_map
+
+def update_from_files(filename, filelist, inpath='', **kwargs):
+    """
+    DESCRIPTION: Streams over processed volumes and adds each one to the map saved in filename,
+        creating the map if needed. Volumes already counted are skipped (see update), so this can be
+        rerun as new files arrive.
+
+    INPUTS:
+    filename = Full path of the map file.
+    filelist = List of files. Volume caches (.volcache, see volume_cache) are memory-mapped; any
+        other file is read with pyart.io.read.
+
+    OPTIONAL INPUTS:
+    inpath = Default set to ''. Path prepended to each file in filelist.
+    kwargs = Thresholds passed to quality_control.classify_clutter.
+
+    OUTPUTS:
+    clutter_map = The updated map, which is also saved to filename.
+    """
+    clutter_map = load(filename)
+    for name in filelist:
+        fqfn = inpath + name
+        if fqfn.endswith('.volcache'):
+            radar = volume_cache.read_volume(fqfn)
+        else:
+            radar = pyart.io.read(fqfn)
+        clutter_map = update(clutter_map, radar, **kwargs)
+        del radar
+    if clutter_map is not None:
+        save(clutter_map, filename)
+    return clutter_map
+
+def get_mask(clutter_map, radar, min_fraction=0.5, min_visits=3):
+    """
+    DESCRIPTION: Clutter mask for a volume, for quality_control.removeMountainClutter.
+
+    INPUTS:
+    clutter_map = Dictionary holding the map.
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+
+    OPTIONAL INPUTS:
+    min_fraction = Default set to 0.5. Fraction of the volumes observing a cell in which it must
+        have been clutter.
+    min_visits = Default set to 3. Cells observed in fewer volumes are left undecided.
+
+    OUTPUTS:
+    clutter_mask = Boolean array (rays x gates) of gates the map marks as clutter.
+    decided = Boolean array (rays x gates) of gates the map can decide: on a tilt in the map, inside
+        its range, and observed in at least min_visits volumes. Pass both to
+        quality_control.removeMountainClutter, which classifies the other gates from the volume itself.
+    """
+    clutter_mask = np.zeros((radar.nrays, radar.ngates), dtype=bool)
+    decided = np.zeros((radar.nrays, radar.ngates), dtype=bool)
+    if clutter_map is None or len(clutter_map['tilts']) == 0:
+        return clutter_mask, decided
+
+    tilt, angle_bin, gate, in_map = _cells(clutter_map, radar, add_tilts=False)
+    known = tilt >= 0
+    hits = clutter_map['hits'][tilt[known][:, np.newaxis], angle_bin[known][:, np.newaxis], gate[np.newaxis, :]]
+    visits = clutter_map['visits'][tilt[known][:, np.newaxis], angle_bin[known][:, np.newaxis], gate[np.newaxis, :]]
+    decided[known] = (visits >= min_visits) & in_map[np.newaxis, :]
+    clutter_mask[known] = decided[known] & (hits >= min_fraction*visits)
+    return clutter_mask, decided
+
+@contextmanager
+def _locked(lockname, timeout):
+    """
+    DESCRIPTION: Holds an exclusive lock file while the block runs. Creating the file with O_EXCL
+    is atomic on Windows and Linux alike. Locks older than STALE_LOCK seconds are taken over.
+    """
+    waited = 0.
+    while True:
+        try:
+            handle = os.open(lockname, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(lockname) > STALE_LOCK:
+                    os.remove(lockname)
+                    continue
+            except OSError:
+                continue #Released in the meantime
+            if waited >= timeout:
+                raise TimeoutError('Clutter map is locked: %s' % lockname)
+            time.sleep(0.05)
+            waited += 0.05
+    try:
+        yield
+    finally:
+        os.close(handle)
+        os.remove(lockname)
+
+def _cells(clutter_map, radar, add_tilts):
+    """
+    DESCRIPTION: Map indices for every ray and gate of a volume: tilt and angle bin per ray, gate per
+    range gate, and whether each gate falls inside the map. Unknown tilts get index -1, or are added
+    to the map if add_tilts is True.
+    """
+    if radar.scan_type == 'rhi':
+        tilt_angle = radar.azimuth['data']
+        angle = radar.elevation['data']
+        angle_span = 180.
+    else:
+        tilt_angle = radar.elevation['data']
+        angle = radar.azimuth['data']
+        angle_span = 360.
+    # Each sweep is assigned to its fixed angle, so every ray of a sweep shares a tilt
+    fixed = np.round(radar.fixed_angle['data'].astype(float), TILT_DECIMALS)
+    ray_fixed = np.empty(radar.nrays)
+    for sweep, (start, end) in enumerate(zip(radar.sweep_start_ray_index['data'], radar.sweep_end_ray_index['data'])):
+        ray_fixed[start:end + 1] = fixed[sweep]
+    if not np.isfinite(ray_fixed).all():
+        ray_fixed = np.round(tilt_angle.astype(float), TILT_DECIMALS)
+
+    tilts = clutter_map['tilts']
+    if add_tilts:
+        for value in np.unique(ray_fixed):
+            if float(value) not in tilts:
+                tilts.append(float(value))
+                clutter_map['recent_times'].append([])
+                for key in ('hits', 'visits'):
+                    empty = np.zeros((1,) + clutter_map[key].shape[1:], dtype=np.uint16)
+                    clutter_map[key] = np.concatenate([clutter_map[key], empty])
+    lookup = dict((value, index) for index, value in enumerate(tilts))
+    tilt = np.array([lookup.get(float(value), -1) for value in ray_fixed], dtype=np.intp)
+
+    nbins = clutter_map['azimuth_bins']
+    angle_bin = np.clip((np.mod(angle, angle_span)/angle_span*nbins).astype(np.intp), 0, nbins - 1)
+
+    ngates = clutter_map['hits'].shape[2]
+    gate = np.round((radar.range['data'] - clutter_map['first_gate'])/clutter_map['gate_spacing']).astype(np.intp)
+    in_map = (gate >= 0) & (gate < ngates)
+    gate = np.clip(gate, 0, ngates - 1)
+    return tilt, angle_bin, gate, in_map
@@ -11,9 +11,9 @@ import pylab as pl
 
 max_luminance = 100
 min_luminance = 0
-LCH = colormap.LCH_Spiral()[0]
-LCH_zdr = colormap.LCH_Spiral(nc = 100, np = .3, offset = 0, reverse = 1, L_range = [max_luminance, min_luminance], name = 'LCH_zdr')[0]
-LCH_wid = colormap.LCH_Spiral(nc = 100, np = .3, offset = 45, reverse = 0, L_range = [max_luminance, min_luminance], name = 'LCH_wid')[0]
+LCH = colormap.cached_LCH_Spiral()
+LCH_zdr = colormap.cached_LCH_Spiral(nc = 100, np = .3, offset = 0, reverse = 1, L_range = [max_luminance, min_luminance], name = 'LCH_zdr')
+LCH_wid = colormap.cached_LCH_Spiral(nc = 100, np = .3, offset = 45, reverse = 0, L_range = [max_luminance, min_luminance], name = 'LCH_wid')
 
 #a = np.array([[-2,30]])
 #pl.figure(figsize=(9,1.5))
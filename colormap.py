@@ -9,13 +9,16 @@ Updated 5/23/2019
 """
 
 import numpy as nump
-import colorsys
-import matplotlib
-from matplotlib import pyplot as plt
+import os
 from matplotlib import colors
 import sys
-import seaborn
+# pyplot and seaborn are imported inside the functions that need them. Importing seaborn pulls in
+# pandas and scipy, which made "import colormap" cost more than building all of the colormaps.
 
+#On-disk registry of generated colormaps (uint8 lookup tables), see cached_LCH_Spiral
+COLORMAP_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'colormap_cache')
+LUT_SIZE = 256 #Entries in each lookup table in the registry
+_LUT_REGISTRY = {}
 
 
 def LCH_Spiral(nc = 100, np = .4, offset = 30, reverse = 1, L_range = [100, 0], name = 'LCH'):
@@ -72,39 +75,10 @@ def LCH_Spiral(nc = 100, np = .4, offset = 30, reverse = 1, L_range = [100, 0],
         sys.exit(1)
         
     #define Lch colormap
+    mp = LCH_Spiral_rgba(nc, np, offset, reverse, L_range)[:,:3]
     
-    L = nump.linspace(L_range[0],L_range[1],nc)
-    C = nump.sqrt(50**2-(L-50)**2)
-    if reverse == 1:
-        H = nump.linspace(360*np,0,nc)+offset
-    else:
-        H = nump.linspace(0,360*np,nc)+offset
-    
-    
-    while sum(H>360)>0:
-        H[H>360]=H[H>360]-360
-    
-    #convert to RGB
-    mp = nump.zeros((nc,3))
-    for i in range(nc):
-        rgb=colorsys.hls_to_rgb(H[i]/100, L[i]/100, C[i]/100)
-        mp[i,:] = rgb
-    
-    #last = nump.ones((nc,1))
-    #mp = nump.concatenate((mp,last),1)  
-    
-    mp_255 = mp*255    
-    hex_mp = []
-    for i in range(nc):
-        #p = []
-        k = mp_255[i,:]
-        #p.append(k[0])
-        #p.append(k[1])
-        #p.append(k[2])
-        hexc = rgb_to_hex((int(k[0]),int(k[1]),int(k[2])))
-        hex_mp.append(hexc)
-    
-    mymap = colors.ListedColormap(hex_mp, name = name) 
+    #quantize to 8 bits per channel, matching the original hex string colors
+    mymap = colors.ListedColormap(quantize(mp)/255., name = name) 
     
     #matplotlib.cm.register_cmap(name = name, cmap=mymap)
 #    
@@ -120,6 +94,88 @@ def LCH_Spiral(nc = 100, np = .4, offset = 30, reverse = 1, L_range = [100, 0],
     
     return mymap, mp
     
+def LCH_Spiral_rgba(nc = 100, np = .4, offset = 30, reverse = 1, L_range = [100, 0]):
+    """
+    Vectorized generator behind LCH_Spiral. Returns the colormap as an nc x 4 
+    float RGBA array (alpha = 1) without building a matplotlib colormap. See 
+    LCH_Spiral for the parameters; no argument checking is done here.
+    
+    The conversion reproduces colorsys.hls_to_rgb(H/100, L/100, C/100) for all
+    colors at once.
+    """
+    L = nump.linspace(L_range[0],L_range[1],nc)
+    C = nump.sqrt(50**2-(L-50)**2)
+    if reverse == 1:
+        H = nump.linspace(360*np,0,nc)+offset
+    else:
+        H = nump.linspace(0,360*np,nc)+offset
+    
+    #wrap hues above 360 back into (0, 360]
+    over = H > 360
+    H[over] -= 360*nump.ceil(H[over]/360 - 1)
+    
+    h = H/100
+    l = L/100
+    s = C/100
+    m2 = nump.where(l <= 0.5, l*(1.0+s), l+s-(l*s))
+    m1 = 2.0*l - m2
+    
+    rgba = nump.ones((nc,4))
+    for channel, shift in enumerate([1/3., 0, -1/3.]):
+        hue = nump.mod(h + shift, 1.0)
+        rgba[:,channel] = nump.select(
+            [hue < 1/6., hue < 0.5, hue < 2/3.],
+            [m1 + (m2-m1)*hue*6.0, m2, m1 + (m2-m1)*(2/3.-hue)*6.0],
+            default=m1)
+    return rgba
+
+def quantize(rgb):
+    """
+    Converts float RGB(A) colors in [0, 1] to a uint8 lookup table, truncating
+    like the int() conversion used for hex color strings. A missing alpha 
+    channel is filled with 255.
+    """
+    lut = nump.full((len(rgb),4), 255, dtype=nump.uint8)
+    lut[:,:rgb.shape[1]] = nump.floor(nump.clip(rgb,0,1)*255)
+    return lut
+
+def cached_LCH_Spiral(nc = 100, np = .4, offset = 30, reverse = 1, L_range = [100, 0], name = 'LCH'):
+    """
+    Same colormap as LCH_Spiral(...)[0], served from a registry. Colormaps are 
+    stored in colormap_cache/ as LUT_SIZE-entry uint8 lookup tables (see get_lut)
+    keyed by their parameters, so each spiral is generated once and then loaded 
+    from disk by every run and every worker process. The returned colormap has 
+    LUT_SIZE colors, each the color of the nc-color spiral at that position.
+    """
+    key = 'LCH_nc%d_np%g_off%g_rev%d_L%g-%g_N%d' % (nc, np, offset, reverse, L_range[0], L_range[1], LUT_SIZE)
+    if key not in _LUT_REGISTRY:
+        path = os.path.join(COLORMAP_CACHE, key + '.npy')
+        try:
+            lut = nump.load(path)
+        except (IOError, ValueError):
+            lut = get_lut(LCH_Spiral(nc, np, offset, reverse, L_range, name)[0], LUT_SIZE)
+            try:
+                os.makedirs(COLORMAP_CACHE, exist_ok=True)
+                tmp_path = '%s.%d.tmp.npy' % (path[:-4], os.getpid())
+                nump.save(tmp_path, lut)
+                os.replace(tmp_path, path)
+            except OSError:
+                pass #Read-only location, keep the colormap in memory only
+        _LUT_REGISTRY[key] = lut
+    return colors.ListedColormap(_LUT_REGISTRY[key]/255., name = name)
+
+def get_lut(cmap, N = 256):
+    """
+    Returns an N x 4 uint8 RGBA lookup table for a colormap (a colormap object
+    or the name of a matplotlib colormap). Entry i is the color for the i-th of
+    N equal bins between vmin and vmax, for rendering paths that index colors 
+    directly instead of going through matplotlib normalization.
+    """
+    if isinstance(cmap, str):
+        from matplotlib import pyplot as plt
+        cmap = plt.get_cmap(cmap)
+    rgba = nump.asarray(cmap(nump.linspace(0,1,N)))
+    return nump.round(rgba*255).astype(nump.uint8)
     
 def PID_Integer():
     """
@@ -167,12 +223,54 @@ def convert_to_grey(x, vmin, vmax):
     return grey
 
 
-def cuckoo():
+def cuckoo(from_seaborn = False):
     """
     Red/green colorblind-safe diverging (brown-red to blue-green) colormap. Conserves luminance.
+    
+    By default the colormap is built from CUCKOO_HEX, a 256-entry table precomputed from
+    seaborn.diverging_palette(34,174,center='light',as_cmap=True) (seaborn 0.13.2), so seaborn is 
+    not needed. Set from_seaborn = True to generate it with seaborn instead.
     """
-    cuckooBrownHue = 34
-    cuckooGrayBlueHue= 174
-    cuckooPalette = seaborn.diverging_palette(cuckooBrownHue,cuckooGrayBlueHue,center='light',as_cmap=True)
+    if from_seaborn:
+        import seaborn
+        cuckooBrownHue = 34
+        cuckooGrayBlueHue= 174
+        cuckooPalette = seaborn.diverging_palette(cuckooBrownHue,cuckooGrayBlueHue,center='light',as_cmap=True)
+    else:
+        cuckooPalette = colors.ListedColormap(CUCKOO_HEX, name = 'cuckoo')
     return cuckooPalette
+
+# Precomputed cuckoo palette, see cuckoo()
+CUCKOO_HEX = ['#aa6739','#aa683b','#ab693c','#ab6a3e','#ac6b3f','#ad6c40','#ad6d42','#ae6e43',
+               '#ae6f45','#af7046','#af7148','#b07249','#b1744a','#b1754c','#b2764d','#b2774f',
+               '#b37850','#b37952','#b47a53','#b57b55','#b57c56','#b67d57','#b67e59','#b77f5a',
+               '#b7815c','#b8825d','#b9835f','#b98460','#ba8561','#ba8663','#bb8764','#bb8866',
+               '#bc8967','#bd8a69','#bd8b6a','#be8c6b','#be8e6d','#bf8f6e','#bf9070','#c09171',
+               '#c19273','#c19374','#c29475','#c29577','#c39678','#c3977a','#c4987b','#c5997d',
+               '#c59b7e','#c69c80','#c69d81','#c79e82','#c79f84','#c8a085','#c9a187','#c9a288',
+               '#caa38a','#caa48b','#cba58c','#cba68e','#cca88f','#cda991','#cdaa92','#ceab94',
+               '#cfac96','#cfae97','#d0af99','#d0b09a','#d1b19c','#d1b29d','#d2b39e','#d3b4a0',
+               '#d3b5a1','#d4b6a3','#d4b7a4','#d5b8a6','#d5b9a7','#d6bba8','#d7bcaa','#d7bdab',
+               '#d8bead','#d8bfae','#d9c0b0','#d9c1b1','#dac2b2','#dbc3b4','#dbc4b5','#dcc5b7',
+               '#dcc6b8','#ddc8ba','#ddc9bb','#decabc','#dfcbbe','#dfccbf','#e0cdc1','#e0cec2',
+               '#e1cfc4','#e1d0c5','#e2d1c7','#e3d2c8','#e3d3c9','#e4d5cb','#e4d6cc','#e5d7ce',
+               '#e5d8cf','#e6d9d1','#e7dad2','#e7dbd3','#e8dcd5','#e8ddd6','#e9ded8','#e9dfd9',
+               '#eae0db','#ebe2dc','#ebe3dd','#ece4df','#ece5e0','#ede6e2','#ede7e3','#eee8e5',
+               '#efe9e6','#efeae8','#f0ebe9','#f0ecea','#f1edec','#f1efed','#f2f0ef','#f2f1f1',
+               '#eff2f1','#eaf2f0','#e9f1ef','#e7f0ee','#e6efed','#e5eeec','#e3edeb','#e2edea',
+               '#e0ece9','#dfebe8','#deeae7','#dce9e6','#dbe8e6','#dae7e5','#d8e6e4','#d7e6e3',
+               '#d5e5e2','#d4e4e1','#d3e3e0','#d1e2df','#d0e1de','#cfe0dd','#cddfdc','#ccdedb',
+               '#cadeda','#c9ddd9','#c8dcd8','#c6dbd7','#c5dad6','#c4d9d5','#c2d8d4','#c1d7d3',
+               '#bfd7d2','#bed6d1','#bdd5d0','#bbd4cf','#bad3cf','#b9d2ce','#b7d1cd','#b6d0cc',
+               '#b5d0cb','#b3cfca','#b2cec9','#b0cdc8','#afccc7','#aecbc6','#accac5','#abc9c4',
+               '#aac9c3','#a8c8c2','#a7c7c1','#a5c6c0','#a4c5bf','#a3c4be','#a1c3bd','#a0c2bc',
+               '#9fc1bb','#9dc1ba','#9cc0b9','#9abfb8','#99beb8','#98bdb7','#96bcb6','#95bbb5',
+               '#93bab3','#91b9b2','#90b8b1','#8fb7b0','#8db6af','#8cb6ae','#8bb5ad','#89b4ac',
+               '#88b3ac','#86b2ab','#85b1aa','#84b0a9','#82afa8','#81afa7','#80aea6','#7eada5',
+               '#7daca4','#7baba3','#7aaaa2','#79a9a1','#77a8a0','#76a89f','#75a79e','#73a69d',
+               '#72a59c','#70a49b','#6fa39a','#6ea299','#6ca198','#6ba097','#6aa096','#689f95',
+               '#679e95','#659d94','#649c93','#639b92','#619a91','#609990','#5f998f','#5d988e',
+               '#5c978d','#5a968c','#59958b','#58948a','#569389','#559288','#549287','#529186',
+               '#519085','#508f84','#4e8e83','#4d8d82','#4b8c81','#4a8b80','#498b7f','#478a7e',
+               '#46897e','#45887d','#43877c','#42867b','#40857a','#3f8479','#3e8378','#3c8377']
     
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Content-addressed on-disk cache of decoded raw radar volumes. Decoding KASPR, CHILL UF,
+or NEXRAD Level 2 (with its bz2 records) is repeated in every experiment even though the raw files
+never change. Radar objects returned by the PyART readers are saved with gen_fun.save_object, keyed
+on a hash of the raw file contents, the reader, the PyART version, and the field mapping. Later runs
+memory-map the cached volume instead of decoding the file again.
+Contains:
+    get_key
+    read
+    evict
+
+The cache directory is bounded in size. Each cache hit refreshes the modification time of its file,
+and the least recently used files are deleted once the directory grows past the size limit.
+
+Version date: 10/19/2026
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import struct
+import pyart
+import gen_fun
+
+CACHE_VERSION = 1 #Increment when the cached layout or the reader modifications change
+CACHE_EXTENSION = '.rawcache'
+HASH_CHUNK = 1 << 20
+
+def get_key(fqfn, reader, field_names=None):
+    """
+    DESCRIPTION: Builds the cache key for a raw radar file.
+
+    INPUTS:
+    fqfn = Full path to the raw radar file.
+    reader = Name of the pyart.io function used to decode the file, e.g. 'read' or 'read_uf'.
+
+    OPTIONAL INPUTS:
+    field_names = Dictionary mapping file field names to radar field names, as passed to the reader.
+
+    OUTPUTS:
+    key = Hex digest of the file contents plus the reader version and field mapping.
+    """
+    digest = hashlib.sha1()
+    with open(fqfn, 'rb') as infile:
+        for chunk in iter(lambda: infile.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+
+    reader_info = json.dumps([CACHE_VERSION, pyart.__version__, reader, field_names], sort_keys=True)
+    digest.update(reader_info.encode('utf-8'))
+    key = digest.hexdigest()
+    return key
+
+def read(fqfn, cachedir, reader='read', field_names=None, max_gb=20):
+    """
+    DESCRIPTION: Returns the decoded radar object for a raw file, decoding it only if it is not
+        already in the cache.
+
+    INPUTS:
+    fqfn = Full path to the raw radar file.
+    cachedir = Directory holding the cache files. Created if it does not exist.
+
+    OPTIONAL INPUTS:
+    reader = Default set to 'read'. Name of the pyart.io function used to decode the file.
+    field_names = Default set to None. Field mapping passed to the reader (needed for CHILL UF).
+    max_gb = Default set to 20. Size limit of the cache directory in gigabytes.
+
+    OUTPUTS:
+    radar = A python object structure that contains radar information, as created by PyART in
+        one of the pyart.io.read functions.
+    """
+    cachename = os.path.join(cachedir, get_key(fqfn, reader, field_names) + CACHE_EXTENSION)
+
+    if os.path.isfile(cachename):
+        try:
+            radar = gen_fun.read_object(cachename)
+            os.utime(cachename, None) #Mark as recently used
+            return radar
+        except (OSError, ValueError, EOFError, KeyError, IndexError, AttributeError, ImportError,
+                OverflowError, pickle.UnpicklingError, struct.error):
+            pass #Evicted by another process or damaged; decode again below
+
+    if field_names is None:
+        radar = getattr(pyart.io, reader)(fqfn)
+    else:
+        radar = getattr(pyart.io, reader)(fqfn, field_names=field_names)
+
+    if not os.path.isdir(cachedir):
+        os.makedirs(cachedir, exist_ok=True)
+    gen_fun.save_object(radar, cachename)
+    evict(cachedir, max_gb)
+    return radar
+
+def evict(cachedir, max_gb):
+    """
+    DESCRIPTION: Deletes the least recently used cache files until the cache directory fits
+        within the size limit.
+
+    INPUTS:
+    cachedir = Directory holding the cache files.
+    max_gb = Size limit of the cache directory in gigabytes.
+
+    OUTPUTS:
+    None. Files are deleted in place.
+    """
+    entries = []
+    total = 0
+    for entry in os.scandir(cachedir):
+        if entry.is_file() and entry.name.endswith(CACHE_EXTENSION):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+    max_bytes = max_gb * 1024**3
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass #In use by another process (Windows) or already removed
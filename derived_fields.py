@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Registry of fields derived from the observed radar fields (snow rate, vdiv, Kdp, EDR, ...). Each
+entry declares the fields it is calculated from and how it is plotted. Derived fields are attached
+to a radar object as lazy entries of radar.fields (a PyART LazyLoadDict, as used for gate_x/y/z in
+the Radar class), so each one is calculated the first time it is accessed, then kept for the rest of
+that volume. Fields that are never plotted or saved are never calculated.
+Contains:
+    register
+    attach
+    plot_settings
+
+To add a derived field, write a function in calculated_fields that takes the radar object and returns
+a field dictionary, then register it below.
+
+Version date: 10/19/2026
+"""
+
+from pyart.lazydict import LazyLoadDict
+import calculated_fields
+import colormap
+
+# name: {'function': callable(radar) returning a field dictionary,
+#        'inputs': fields the function reads; a tuple lists alternative names for one input,
+#        'range', 'cmap', 'colorbar_label': plot settings passed to Master_plotter}
+DERIVED_FIELDS = {}
+
+def register(name, function, inputs, vrange, cmap, colorbar_label):
+    """
+    DESCRIPTION: Adds a derived field to the registry, replacing any existing entry with the same name.
+
+    INPUTS:
+    name = Name of the new field in radar.fields.
+    function = Function that takes the radar object (and any options given to attach) and returns the
+        field dictionary.
+    inputs = List of the fields the function reads. An entry may be a tuple of alternative names,
+        e.g. ('dealiased_velocity','PyART_dealiased_velocity'). Inputs can be other derived fields.
+    vrange = Tuple of (min, max) values for the colorbar.
+    cmap = Colormap name or object for plotting.
+    colorbar_label = Colorbar label.
+    """
+    DERIVED_FIELDS[name] = {'function': function, 'inputs': list(inputs), 'range': vrange,
+                            'cmap': cmap, 'colorbar_label': colorbar_label}
+
+def attach(radar, names, options=None):
+    """
+    DESCRIPTION: Attaches derived fields to a radar object without calculating them.
+
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    names = List of derived field names, in the order they should be plotted.
+
+    OPTIONAL INPUTS:
+    options = Default set to None. Dictionary of {name: dictionary of keyword arguments} passed to
+        the functions of the derived fields, e.g. {'edr': {'threads': 4}}.
+
+    OUTPUTS:
+    attached = List of the names that are now available in radar.fields. Fields already in the
+        radar object (e.g. from a cached volume) are kept as they are. Fields whose inputs are
+        missing are skipped with a message.
+    """
+    if not isinstance(radar.fields, LazyLoadDict):
+        radar.fields = LazyLoadDict(radar.fields)
+
+    attached = []
+    for name in names:
+        # has_key checks lazy entries without calculating them (the in operator would calculate them)
+        if not radar.fields.has_key(name):
+            missing = [inputs for inputs in DERIVED_FIELDS[name]['inputs']
+                       if not _available(radar, inputs)]
+            if missing:
+                print("Skipping %s, missing input fields: %s" % (name, missing))
+                continue
+            radar.fields.set_lazy(name, _derived_field_factory(radar, name, (options or {}).get(name, {})))
+        attached.append(name)
+    return attached
+
+def plot_settings(name):
+    """
+    DESCRIPTION: Returns the plot settings of a registered derived field.
+
+    INPUTS:
+    name = Derived field name.
+
+    OUTPUTS:
+    vrange = Tuple of (min, max) values for the colorbar.
+    cmap = Colormap.
+    colorbar_label = Colorbar label.
+    """
+    entry = DERIVED_FIELDS[name]
+    return entry['range'], entry['cmap'], entry['colorbar_label']
+
+def _available(radar, inputs):
+    """
+    DESCRIPTION: Checks whether an input (or one of its alternative names) is in radar.fields, without
+    calculating inputs that are themselves lazy derived fields.
+    """
+    if isinstance(inputs, str):
+        inputs = (inputs,)
+    return any(radar.fields.has_key(name) for name in inputs)
+
+def _derived_field_factory(radar, name, kwargs):
+    """
+    DESCRIPTION: Returns a function that calculates a derived field. The radar object, field name,
+    and keyword arguments are bound now; the calculation runs when the LazyLoadDict entry is first
+    accessed.
+    """
+    def calculate():
+        """ Calculate the derived field. """
+        return DERIVED_FIELDS[name]['function'](radar, **kwargs)
+    return calculate
+
+register('snow_rate', calculated_fields.snow_rate_field, ['reflectivity'],
+         (0,1.25), 'viridis', 'Snow rate (mm/hr)') #or YlGnBu
+register('precip_rate', calculated_fields.precip_rate_field, ['reflectivity'],
+         (0,50), 'viridis', 'Rain rate (mm/hr)')
+register('kdp', calculated_fields.kdp_derivative_field, ['specific_differential_phase'],
+         (-2,2), 'RdBu_r', 'd(PhiDP)/gate')
+register('kdp_lsq', calculated_fields.kdp_lsq_field, [calculated_fields.PHIDP_FIELDS],
+         (-3,3), colormap.cuckoo(), 'Kdp (deg/km)')
+register('edr', calculated_fields.eddy_dissipation_rate_field, [calculated_fields.WIDTH_FIELDS],
+         (0,0.5), 'magma', 'EDR (m^(2/3) s^(-1))')
+register('vdiv', calculated_fields.velocity_vertical_divergence_field,
+         [('dealiased_velocity','PyART_dealiased_velocity')],
+         (0,10), 'inferno', '|vDiv| ms^(-1)/km')
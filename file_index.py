@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Persistent index of the radar files in a directory. The index records each file's name,
+size, modification time, scan time read from the file name, and radar (see radar_profiles). It is saved
+in file_index_cache/ (next to this module, so read-only archives can be indexed too) and brought up to
+date incrementally with os.scandir: files whose size and modification time are unchanged keep their
+entry. If the directory itself has not changed since the last scan, the saved index is used as it is.
+Scanning never opens a file. The radar of a file is recognized from its header only when query returns
+it, and is then kept in the index, so each file is opened at most once across runs.
+Contains:
+    scan
+    query
+    load
+    save
+
+INDEX LAYOUT:
+    The index is a dictionary {'path': the indexed directory, 'dir_mtime': modification time of the
+    directory when it was scanned, 'files': {name: (size, mtime, radar, time)}}, where radar is a
+    profile name, None if no profile matches, or UNDETECTED if the header has not been read yet, and
+    time is seconds since 1970-01-01 UTC or None. The file uses the volume_cache container format (JSON
+    header followed by raw arrays).
+
+Version date: 10/19/2026
+"""
+
+import calendar
+import fnmatch
+import hashlib
+import os
+import numpy as np
+import radar_profiles
+import volume_cache
+
+INDEX_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'file_index_cache')
+INDEX_VERSION = 2
+UNDETECTED = '?' #Radar of a file whose header has not been read yet
+_INDEXES = {} #index_path: index, so repeated scans in one process skip loading the file
+
+def scan(inpath, index_path=None, full=False):
+    """
+    DESCRIPTION: Brings the index of a directory up to date and saves it. Only the directory listing
+        is read; radars are recognized later by query.
+
+    INPUTS:
+    inpath = A string that specifies the path to the radar files.
+
+    OPTIONAL INPUTS:
+    index_path = Default set to None, which saves the index in INDEX_CACHE under a name made from
+        inpath. If the index cannot be saved, it is kept in memory for the rest of the process.
+    full = Default set to False. Set to True to check every file even if the directory has not
+        changed (e.g. after files were overwritten in place, which does not change the directory).
+
+    OUTPUTS:
+    index = Index dictionary (see INDEX LAYOUT).
+    """
+    if index_path is None:
+        key = hashlib.sha1(os.path.abspath(inpath).encode('utf-8')).hexdigest()[:16]
+        index_path = os.path.join(INDEX_CACHE, key + '.index')
+    index = _INDEXES.get(index_path)
+    if index is None:
+        index = load(index_path)
+    dir_mtime = os.stat(inpath).st_mtime
+    if index is not None and index['dir_mtime'] == dir_mtime and not full:
+        index['path'] = inpath
+        index['index_path'] = index_path
+        _INDEXES[index_path] = index
+        return index
+
+    old_files = index['files'] if index is not None else {}
+    files = {}
+    for entry in os.scandir(inpath):
+        if entry.name.startswith('.') or not entry.is_file():
+            continue
+        stat = entry.stat()
+        previous = old_files.get(entry.name)
+        if previous is not None and previous[0] == stat.st_size and previous[1] == stat.st_mtime:
+            files[entry.name] = previous
+        else:
+            files[entry.name] = (stat.st_size, stat.st_mtime, UNDETECTED,
+                                 _scan_time(radar_profiles.match_name(entry.name), entry.name))
+
+    index = {'path': inpath, 'index_path': index_path, 'dir_mtime': dir_mtime, 'files': files}
+    _INDEXES[index_path] = index
+    _save_quietly(index)
+    return index
+
+def query(index, wildcard=None, radar_type=None, start=None, end=None, detect=True):
+    """
+    DESCRIPTION: Selects files from an index. The radars of the selected files are recognized from
+        their headers if that has not been done yet, and the index is saved with them.
+
+    INPUTS:
+    index = Index dictionary from scan.
+
+    OPTIONAL INPUTS:
+    wildcard = Default set to None. Only files whose name contains this phrase (glob characters
+        such as * and ? are allowed, as in gen_fun.get_filelist).
+    radar_type = Default set to None. Only files from this radar profile, e.g. 'KASPR'.
+    start = Default set to None. datetime.datetime (UTC). Only files with a scan time at or after start.
+    end = Default set to None. datetime.datetime (UTC). Only files with a scan time before end.
+        Files without a scan time are left out when start or end is given.
+    detect = Default set to True. Set to False to leave radars unrecognized when they are not needed,
+        so no file is opened. Files still have to be opened when radar_type is given, or when start or
+        end is given and a file's name matches no profile's wildcards.
+
+    OUTPUTS:
+    filelist = Sorted list of file names.
+    """
+    files = index['files']
+    names = files.keys()
+    if wildcard is not None:
+        names = fnmatch.filter(names, '*' + wildcard + '*')
+    if start is not None or end is not None:
+        # Files whose name matches no profile's wildcards only get a scan time once their radar is known
+        _detect(index, [name for name in names if files[name][3] is None])
+        start_time = calendar.timegm(start.timetuple()) if start is not None else -np.inf
+        end_time = calendar.timegm(end.timetuple()) if end is not None else np.inf
+        names = [name for name in names if files[name][3] is not None and start_time <= files[name][3] < end_time]
+    if detect or radar_type is not None:
+        _detect(index, names)
+    if radar_type is not None:
+        names = [name for name in names if files[name][2] == radar_type]
+    filelist = sorted(names)
+    return filelist
+
+def load(index_path):
+    """
+    DESCRIPTION: Loads an index saved with save.
+
+    INPUTS:
+    index_path = Full path of the index file.
+
+    OUTPUTS:
+    index = Index dictionary, or None if there is no usable index file.
+    """
+    if not os.path.isfile(index_path):
+        return None
+    try:
+        header, blocks = volume_cache.read_container(index_path, mmap=False)
+    except (OSError, ValueError):
+        return None
+    if header.get('version') != INDEX_VERSION:
+        return None
+    radars = [None] + header['radars'] + [UNDETECTED] #Code -1 is UNDETECTED
+    size, mtime, radar_code, scan_time = blocks
+    times = [None if np.isnan(value) else value for value in scan_time.tolist()]
+    files = dict(zip(header['names'], zip(size.tolist(), mtime.tolist(),
+                                          [radars[code] for code in radar_code.tolist()], times)))
+    return {'path': header['path'], 'index_path': index_path, 'dir_mtime': header['dir_mtime'], 'files': files}
+
+def save(index, index_path):
+    """
+    DESCRIPTION: Saves an index. The file is replaced in one step, so a process reading the index
+        never sees a partial file.
+
+    INPUTS:
+    index = Index dictionary.
+    index_path = Full path of the index file.
+
+    OUTPUTS:
+    The saved index file.
+    """
+    names = list(index['files'])
+    entries = [index['files'][name] for name in names]
+    radars = sorted(set(entry[2] for entry in entries if entry[2] not in (None, UNDETECTED)))
+    codes = dict((radar_type, number + 1) for number, radar_type in enumerate(radars))
+    codes[UNDETECTED] = -1
+    blocks = [np.array([entry[0] for entry in entries], dtype=np.int64),
+              np.array([entry[1] for entry in entries], dtype=np.float64),
+              np.array([codes.get(entry[2], 0) for entry in entries], dtype=np.int16),
+              np.array([np.nan if entry[3] is None else entry[3] for entry in entries], dtype=np.float64)]
+    header = {'version': INDEX_VERSION, 'path': index['path'], 'dir_mtime': index['dir_mtime'],
+              'names': names, 'radars': radars}
+    volume_cache.write_container(index_path, header, blocks)
+
+def _detect(index, names):
+    """
+    DESCRIPTION: Recognizes the radar of the named files that have not been checked yet, rereading
+    the scan time with the recognized profile, and saves the index if anything changed.
+    """
+    files = index['files']
+    changed = False
+    for name in names:
+        size, mtime, radar_type, scan_time = files[name]
+        if radar_type != UNDETECTED:
+            continue
+        radar_type = radar_profiles.match(os.path.join(index['path'], name))
+        if radar_type is not None:
+            scan_time = _scan_time(radar_type, name)
+        files[name] = (size, mtime, radar_type, scan_time)
+        changed = True
+    if changed:
+        _save_quietly(index)
+
+def _scan_time(radar_type, name):
+    """
+    DESCRIPTION: Scan time of a file in seconds since 1970-01-01 UTC, read from its name with the
+    time_position of a profile, or None.
+    """
+    if radar_type is None:
+        return None
+    scan_time = radar_profiles.filename_time(radar_type, name)
+    if scan_time is None:
+        return None
+    return calendar.timegm(scan_time.timetuple())
+
+def _save_quietly(index):
+    """
+    DESCRIPTION: Saves an index to its index_path, keeping it in memory only if that fails.
+    """
+    try:
+        os.makedirs(os.path.dirname(index['index_path']), exist_ok=True)
+        save(index, index['index_path'])
+    except OSError:
+        pass #Read-only location, keep the index in memory only
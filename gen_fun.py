@@ -7,12 +7,17 @@ Created on Thu Aug 06 12:42:46 2015
 Maintained by Daniel Hueholt
 Last updated: 5/23/2019
 """
-import glob
+import datetime
+import file_index
+import io
 import os
 import numpy as np
+import re
 import string
+import overlay_geometry
 import quality_control
-import _pickle as pickle
+import volume_cache
+import pickle
 
 def get_azimuth(radar, sweepnum):
     """
@@ -32,10 +37,78 @@ def get_azimuth(radar, sweepnum):
         azi = radar.azimuth['data'][np.size(radar.azimuth['data'])-1]
     return azi
 
+# Formats of the reference time in radar.time['units'] (e.g. "seconds since 2019-12-01T00:00:00Z"), after
+# the T, a trailing Z or UTC, and any time zone offset are removed
+TIME_UNIT_FORMATS = ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M', '%Y-%m-%d')
+TIME_OFFSET = re.compile(r'[+-]\d{1,2}(:?\d{2})?$') #Offset written onto the time, e.g. 00:00:00+05:30
+TIME_ZONE = re.compile(r'^([+-]?)(\d{1,2})(?::?(\d{2}))?$') #Sign, hours, and minutes of an offset
+
+def get_sweep_times(radar):
+    """
+    DESCRIPTION: Finds the start time of every sweep from radar.time, in one pass over the volume.
+    
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    
+    OUTPUTS:
+    sweep_times = List of datetime.datetime (UTC), one per sweep, in sweep order. A time zone offset
+        in the reference time (e.g. +05:30, -0500, or a separate "0:00") is applied; a reference
+        without one is UTC, as in the CF conventions. None if the reference time or its offset in
+        radar.time['units'] cannot be read (e.g. radars that record their units as "seconds"), in
+        which case the caller should fall back on the file name.
+    """
+    units = radar.time.get('units', '')
+    if 'since' not in units:
+        return None
+    reference = re.sub(r'(\d)T(\d)', r'\1 \2', units.split('since')[-1].strip())
+    for utc in ('Z', 'UTC'):
+        if reference.endswith(utc):
+            reference = reference[:-len(utc)]
+    tokens = reference.split()
+    if not tokens:
+        return None
+    
+    # Separate the offset: written onto the time, or as the token after the date or time
+    zone = None
+    if len(tokens) > 1 and tokens[1][0] in '+-':
+        zone = tokens.pop(1)
+    elif len(tokens) > 1 and TIME_OFFSET.search(tokens[1]):
+        match = TIME_OFFSET.search(tokens[1])
+        zone = match.group(0)
+        tokens[1] = tokens[1][:match.start()]
+    if len(tokens) > 2:
+        zone = tokens.pop(2) if zone is None else None
+    if len(tokens) > 2:
+        return None
+    offset = datetime.timedelta(0)
+    if zone is not None:
+        match = TIME_ZONE.match(zone)
+        if match is None:
+            return None
+        sign = -1 if match.group(1) == '-' else 1
+        offset = sign*datetime.timedelta(hours=int(match.group(2)), minutes=int(match.group(3) or 0))
+    
+    reference = ' '.join(tokens)
+    for time_format in TIME_UNIT_FORMATS:
+        try:
+            base = datetime.datetime.strptime(reference, time_format) - offset
+            break
+        except ValueError:
+            continue
+    else:
+        return None
+    
+    seconds = np.asarray(radar.time['data'])[radar.sweep_start_ray_index['data']]
+    sweep_times = [base + datetime.timedelta(seconds=float(second)) for second in seconds]
+    return sweep_times
+
 def get_filelist(inpath, wildcard, savefile):
     """
     DESCRIPTION: Generates a list of files that contain the specified wildcard 
-        file their file name that in the specified path.
+        file their file name that in the specified path. The list comes from the
+        directory's file index (see file_index), so only files added since the
+        last call are looked at, and the working directory is not changed.
         
     INPUTS:
     inpath = A string that specifies the path to the desired files. 
@@ -43,23 +116,17 @@ def get_filelist(inpath, wildcard, savefile):
         files. The files in the inpath directory will be sorted using this 
         variable.
     savefile = A boolean value where True will save off a text files containing
-        the names of the desired files separated by a newline, "\n".
+        the names of the desired files separated by a newline, "\n", in inpath.
         
     OUPUTS:
     filelist = A list of desired file names.
     """
-    # Determine all files in inpath that begin with wildcard
-    os.chdir(inpath)
-    ident = '*' + wildcard
-    identifier = ident + '*'
-    filenamelist = glob.glob(identifier)
-    
-    # Sort the list
-    filelist = sorted(filenamelist)
+    # Determine all files in inpath that contain wildcard, sorted
+    filelist = file_index.query(file_index.scan(inpath), wildcard, detect=False)
     
     if savefile == True:
         # Save the list
-        name = "filelist_%s.txt" % wildcard
+        name = os.path.join(inpath, "filelist_%s.txt" % wildcard)
         txtfile = open(name, "w")
         for item in filelist:
             txtfile.write("%s\n" % item)
@@ -104,23 +171,39 @@ def get_savename(filename, sweepnum, outpath, scan_strat, field, azi, dealias_bo
             save_name = "%s%s.%s.%s.%s.%s.%s.%d.png" % (outpath, split_file[0], split_file[1], split_file[2], split_file[3], split_file[5], field, sweepnum)            
     return save_name
  
-def read_object(filename):
+def read_object(filename, mmap=True):
     """
-    DESCRIPTION: Reads in a string from a file and interprets it as a pickle data
-    stream.  The data stream is then reconstructed back into a Python object.
+    DESCRIPTION: Reconstructs a Python object saved by save_object. Arrays are 
+    copy-on-write views into a memory map of the file, so even a full radar 
+    volume loads almost instantly and workers reading the same file share its
+    pages. Plain pickle files from older versions of save_object still load.
     
     INPUTS:
     filename = The full path to the file.
     
+    OPTIONAL INPUTS:
+    mmap = Default set to True. Set to False to read the arrays into memory.
+    
     OUTPUTS:
     obj = The reconstructed Python object.
     """
-    obj = pickle.load(open(filename, "rb"))
-    return obj    
+    with open(filename, "rb") as infile:
+        is_container = infile.read(len(volume_cache.MAGIC)) == volume_cache.MAGIC
+        if not is_container:
+            infile.seek(0)
+            return pickle.load(infile)
+    
+    header, blocks = volume_cache.read_container(filename, mmap)
+    skeleton = blocks[header['object']]
+    obj = _ArrayUnpickler(io.BytesIO(skeleton.tobytes()), blocks).load()
+    return obj
     
 def save_object(obj, filename):
     """
     DESCRIPTION: Saves Python object to a file by converting it into a byte stream.
+        NumPy arrays (including masked arrays and the fields of a radar object) 
+        are kept out of the byte stream and written as raw buffers, one per 
+        array, after a small metadata header. See volume_cache for the layout.
     
     INPUTS:
     obj = The Python object you wish to save.
@@ -129,13 +212,59 @@ def save_object(obj, filename):
     OUTPUTS: 
     The saved file containing the object.
     """
-    with open(filename, 'wb') as output:
-        pickle.dump(obj, output, pickle.HIGHEST_PROTOCOL)
+    blocks = []
+    skeleton = io.BytesIO()
+    _ArrayPickler(skeleton, blocks).dump(obj)
+    blocks.append(np.frombuffer(skeleton.getvalue(), dtype=np.uint8))
+    volume_cache.write_container(filename, {'object': len(blocks)-1}, blocks)
+
+class _ArrayPickler(pickle.Pickler):
+    """
+    Pickler that replaces NumPy arrays with references to raw buffers.
+    """
+    def __init__(self, file, blocks):
+        pickle.Pickler.__init__(self, file, pickle.HIGHEST_PROTOCOL)
+        self.blocks = blocks
+    
+    def persistent_id(self, obj):
+        if isinstance(obj, np.ma.MaskedArray):
+            if obj.dtype.hasobject:
+                return None
+            self.blocks.append(np.ma.getdata(obj))
+            data_ind = len(self.blocks)-1
+            mask_ind = None
+            if np.ma.getmask(obj) is not np.ma.nomask:
+                self.blocks.append(np.ma.getmask(obj))
+                mask_ind = len(self.blocks)-1
+            return ('masked', data_ind, mask_ind, obj.fill_value)
+        if type(obj) in (np.ndarray, np.memmap) and not obj.dtype.hasobject:
+            self.blocks.append(obj)
+            return ('array', len(self.blocks)-1)
+        return None
+
+class _ArrayUnpickler(pickle.Unpickler):
+    """
+    Unpickler that resolves the raw buffer references made by _ArrayPickler.
+    """
+    def __init__(self, file, blocks):
+        pickle.Unpickler.__init__(self, file)
+        self.blocks = blocks
+    
+    def persistent_load(self, pid):
+        if pid[0] == 'masked':
+            kind, data_ind, mask_ind, fill_value = pid
+            if mask_ind is None:
+                mask = np.ma.nomask
+            else:
+                mask = self.blocks[mask_ind]
+            return np.ma.MaskedArray(self.blocks[data_ind], mask=mask, fill_value=fill_value, copy=False)
+        return self.blocks[pid[1]]
         
 def azi_calculator(azi_lines,max_length):
     """
     DESCRIPTION: Uses trigonometry to calculates coordinates to overlay RHI azimuths
-        on a PPI plot.
+        on a PPI plot. Kept for older scripts; see overlay_geometry for the line segments
+        used by Master_plotter.
         
     INPUTS:
         azi_lines: array containing azimuths to be plotted (in degrees, e.g. [134,224])
@@ -148,26 +277,5 @@ def azi_calculator(azi_lines,max_length):
     See Master_plotter for an example of how this is used in practice.
     
     """
-    x_c = np.empty(np.size(azi_lines))
-    y_c = np.empty(np.size(azi_lines))
-    
-    for count in range(0,np.size(azi_lines)):
-        azi = azi_lines[count]
-        if azi > 0 and azi < 90:
-                azi_rad = np.deg2rad(azi)
-                x_c[count] = np.cos(azi_rad)*max_length
-                y_c[count] = np.sin(azi_rad)*max_length
-        elif azi > 90 and azi < 180:
-                azi_rad = np.deg2rad(azi-90)
-                x_c[count] = np.cos(azi_rad)*max_length
-                y_c[count] = -np.sin(azi_rad)*max_length
-        elif azi > 180 and azi < 270:
-                azi_rad = np.deg2rad(azi-180)
-                x_c[count] = -np.cos(azi_rad)*max_length
-                y_c[count] = -np.sin(azi_rad)*max_length
-        elif azi > 270 and azi < 360:
-                azi_rad = np.deg2rad(azi-270)
-                x_c[count] = -np.cos(azi_rad)*max_length
-                y_c[count] = np.sin(azi_rad)*max_length
-            
+    x_c,y_c = overlay_geometry.azimuth_endpoints(azi_lines,max_length)
     return x_c,y_c
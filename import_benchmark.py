@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Measures how long it takes to import the radar processing modules. Every worker in
+start_script.py pays this cost before processing its first file, so a module that picks up a heavy
+import at load time (e.g. seaborn, which pulls in pandas) shows up here first. Each import is timed
+in a fresh Python process so earlier imports do not hide the cost of later ones.
+Contains:
+    time_import
+    main
+
+Run from this directory with "python import_benchmark.py". Modules are timed in the order given
+in MODULES; pass module names on the command line to time only those.
+
+Version date: 10/19/2026
+"""
+
+import os
+import subprocess
+import sys
+
+MODULES = ['numpy', 'matplotlib.colors', 'matplotlib.pyplot', 'seaborn', 'pyart',
+           'colormap', 'colorbars', 'gen_fun', 'calculated_fields', 'quality_control',
+           'Master_plotter', 'run_fun']
+REPEATS = 5
+
+TIMER = ("import time; t = time.perf_counter(); import %s; "
+         "print(time.perf_counter() - t)")
+
+def time_import(module, repeats=REPEATS):
+    """
+    DESCRIPTION: Times the import of one module in fresh interpreters.
+
+    INPUTS:
+    module = A string containing the name of the module to import.
+
+    OPTIONAL INPUTS:
+    repeats = Default set to REPEATS. Number of fresh interpreters to time. The first run also
+        fills the disk cache and the __pycache__ folders, so the best run is reported.
+
+    OUTPUTS:
+    seconds = The fastest import time in seconds, or None if the module could not be imported.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    for i in range(repeats):
+        result = subprocess.run([sys.executable, '-c', TIMER % module], cwd=here,
+                                stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                universal_newlines=True)
+        if result.returncode != 0:
+            return None
+        times.append(float(result.stdout.split()[-1]))
+    seconds = min(times)
+    return seconds
+
+def main(modules):
+    """
+    DESCRIPTION: Prints the import time of each module.
+
+    INPUTS:
+    modules = List of module names.
+    """
+    print("%-20s %10s" % ('module', 'import ms'))
+    for module in modules:
+        seconds = time_import(module)
+        if seconds is None:
+            print("%-20s %10s" % (module, 'failed'))
+        else:
+            print("%-20s %10.1f" % (module, 1000 * seconds))
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or MODULES)
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Geometry for the lines drawn over PPI plots: RHI azimuth lines, range rings, sector
+edges, and grid lines. All coordinates are computed in single array operations and cached per plot
+domain, so a run that saves hundreds of images with the same limits computes them only once.
+Results are (n, npts, 2) arrays of x/y line segments in km, which is the format
+matplotlib.collections.LineCollection takes directly.
+Contains:
+    azimuth_endpoints
+    azimuth_segments
+    range_ring_segments
+    sector_limits
+    sector_segments
+    grid_segments
+
+Azimuths follow the radar (compass) convention: 0 degrees is north (+y), 90 degrees is east (+x).
+Cached arrays are read-only; copy them before modifying.
+
+Version date: 10/19/2026
+"""
+
+from functools import lru_cache
+import numpy as np
+
+CACHE_SIZE = 64
+
+def azimuth_endpoints(azi_lines, max_length):
+    """
+    DESCRIPTION: Calculates the end points of lines drawn from the radar out along each azimuth.
+
+    INPUTS:
+    azi_lines = Azimuths to be plotted in degrees, e.g. [134,224]. Any value is allowed,
+        including exact multiples of 90 and values outside 0-360.
+    max_length = Length of the lines in km.
+
+    OUTPUTS:
+    x_c = Array containing x-coordinates of the end points
+    y_c = Array containing y-coordinates of the end points
+    """
+    azi_rad = np.deg2rad(np.asarray(azi_lines, dtype=float))
+    x_c = max_length*np.sin(azi_rad)
+    y_c = max_length*np.cos(azi_rad)
+    return x_c, y_c
+
+def azimuth_segments(azi_lines, x_lim, y_lim, max_length=None):
+    """
+    DESCRIPTION: Line segments from the radar along each azimuth, stopped at the edge of the plot.
+
+    INPUTS:
+    azi_lines = Azimuths to be plotted in degrees.
+    x_lim = x-axis limits of the plot in km, e.g. [-60,60].
+    y_lim = y-axis limits of the plot in km.
+
+    OPTIONAL INPUTS:
+    max_length = Default set to None, which uses x_lim[1] (the same length used by
+        gen_fun.azi_calculator). Lines never extend past the plot edge.
+
+    OUTPUTS:
+    segments = Read-only array of shape (len(azi_lines), 2, 2).
+    """
+    if max_length is None:
+        max_length = x_lim[1]
+    return _azimuth_segments(_key(azi_lines), _key(x_lim), _key(y_lim), float(max_length))
+
+def range_ring_segments(ring_spacing, x_lim, y_lim, npts=361):
+    """
+    DESCRIPTION: Range rings every ring_spacing km, out to the farthest corner of the plot.
+
+    INPUTS:
+    ring_spacing = Distance between rings in km. May also be a list of ring ranges in km.
+    x_lim = x-axis limits of the plot in km.
+    y_lim = y-axis limits of the plot in km.
+
+    OPTIONAL INPUTS:
+    npts = Default set to 361. Number of points in each ring.
+
+    OUTPUTS:
+    segments = Read-only array of shape (number of rings, npts, 2).
+    """
+    if np.ndim(ring_spacing) == 0:
+        corner = np.hypot(np.max(np.abs(x_lim)), np.max(np.abs(y_lim)))
+        rings = np.arange(ring_spacing, corner + ring_spacing, ring_spacing)
+    else:
+        rings = ring_spacing
+    return _range_ring_segments(_key(rings), int(npts))
+
+def sector_limits(azimuth):
+    """
+    DESCRIPTION: Finds the edges of a sector scan from its ray azimuths. The sector is taken to be
+        everything outside the largest gap between neighbouring azimuths, so sectors that cross
+        north (e.g. 300 to 40 degrees) are handled correctly.
+
+    INPUTS:
+    azimuth = Array of ray azimuths in degrees, e.g. radar.azimuth['data'].
+
+    OUTPUTS:
+    azi_lim = Array of [start, end] azimuths in degrees, clockwise from start to end.
+    """
+    azi = np.sort(np.mod(np.asarray(azimuth, dtype=float), 360))
+    gaps = np.diff(np.append(azi, azi[0] + 360))
+    widest = np.argmax(gaps)
+    azi_lim = np.array([azi[(widest + 1) % azi.size], azi[widest]])
+    return azi_lim
+
+def sector_segments(azimuth, x_lim, y_lim):
+    """
+    DESCRIPTION: Line segments along the two edges of a sector scan, stopped at the plot edge.
+
+    INPUTS:
+    azimuth = Array of ray azimuths in degrees, e.g. radar.azimuth['data'].
+    x_lim = x-axis limits of the plot in km.
+    y_lim = y-axis limits of the plot in km.
+
+    OUTPUTS:
+    segments = Read-only array of shape (2, 2, 2).
+    """
+    length = np.hypot(np.max(np.abs(x_lim)), np.max(np.abs(y_lim)))
+    return azimuth_segments(sector_limits(azimuth), x_lim, y_lim, max_length=length)
+
+def grid_segments(grid_spacing, x_lim, y_lim):
+    """
+    DESCRIPTION: Vertical and horizontal grid lines every grid_spacing km, spanning the plot.
+
+    INPUTS:
+    grid_spacing = Distance between grid lines in km. Lines are placed at multiples of the spacing.
+    x_lim = x-axis limits of the plot in km.
+    y_lim = y-axis limits of the plot in km.
+
+    OUTPUTS:
+    segments = Read-only array of shape (number of lines, 2, 2).
+    """
+    return _grid_segments(float(grid_spacing), _key(x_lim), _key(y_lim))
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _azimuth_segments(azi_lines, x_lim, y_lim, max_length):
+    """
+    DESCRIPTION: Cached body of azimuth_segments. All arguments are tuples or floats.
+    """
+    x_c, y_c = azimuth_endpoints(azi_lines, 1.0)
+    # Distance along each unit direction to the plot edge it leaves through
+    with np.errstate(divide='ignore'):
+        to_x = np.where(x_c > 0, x_lim[1]/x_c, np.where(x_c < 0, x_lim[0]/x_c, np.inf))
+        to_y = np.where(y_c > 0, y_lim[1]/y_c, np.where(y_c < 0, y_lim[0]/y_c, np.inf))
+    length = np.clip(np.minimum(np.minimum(to_x, to_y), max_length), 0, None)
+
+    segments = np.zeros((len(azi_lines), 2, 2))
+    segments[:, 1, 0] = length*x_c
+    segments[:, 1, 1] = length*y_c
+    return _frozen(segments)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _range_ring_segments(rings, npts):
+    """
+    DESCRIPTION: Cached body of range_ring_segments.
+    """
+    theta = np.linspace(0, 2*np.pi, npts)
+    radius = np.asarray(rings, dtype=float)[:, np.newaxis]
+    segments = np.stack([radius*np.sin(theta), radius*np.cos(theta)], axis=-1)
+    return _frozen(segments)
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _grid_segments(grid_spacing, x_lim, y_lim):
+    """
+    DESCRIPTION: Cached body of grid_segments.
+    """
+    x_lines = grid_spacing*np.arange(np.ceil(x_lim[0]/grid_spacing), np.floor(x_lim[1]/grid_spacing) + 1)
+    y_lines = grid_spacing*np.arange(np.ceil(y_lim[0]/grid_spacing), np.floor(y_lim[1]/grid_spacing) + 1)
+
+    segments = np.empty((x_lines.size + y_lines.size, 2, 2))
+    segments[:x_lines.size, :, 0] = x_lines[:, np.newaxis]
+    segments[:x_lines.size, :, 1] = y_lim
+    segments[x_lines.size:, :, 0] = x_lim
+    segments[x_lines.size:, :, 1] = y_lines[:, np.newaxis]
+    return _frozen(segments)
+
+def _key(values):
+    """
+    DESCRIPTION: Converts limits or azimuth lists to a tuple of floats that can be used as a cache key.
+    """
+    return tuple(float(v) for v in np.ravel(values))
+
+def _frozen(array):
+    """
+    DESCRIPTION: Marks a cached array read-only so callers cannot change it for everyone else.
+    """
+    array.setflags(write=False)
+    return array
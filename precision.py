@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Pipeline-wide floating point precision policy for radar fields. Radar moments carry
+8 to 16 bits of information, so storing them as float64 only doubles memory use and slows down
+every vectorized pass. Fields are converted to FIELD_DTYPE (float32 by default) as soon as a file
+is read, and quality control and derived fields keep them in that type.
+Contains:
+    as_field_dtype
+    apply
+
+To process in double precision, set FIELD_DTYPE = np.float64 below.
+
+Version date: 10/19/2026
+"""
+
+import numpy as np
+
+FIELD_DTYPE = np.float32
+
+def as_field_dtype(data):
+    """
+    DESCRIPTION: Casts floating point data to FIELD_DTYPE. Masked arrays stay masked. Data that
+        already has the right type, or holds integers (e.g. classification fields), is returned
+        unchanged without a copy.
+
+    INPUTS:
+    data = Array or masked array.
+
+    OUTPUTS:
+    data = The data in FIELD_DTYPE.
+    """
+    data = np.asanyarray(data)
+    if data.dtype == FIELD_DTYPE or not np.issubdtype(data.dtype, np.floating):
+        return data
+    return data.astype(FIELD_DTYPE)
+
+def apply(radar):
+    """
+    DESCRIPTION: Converts every field in a radar object to FIELD_DTYPE.
+
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+
+    OUTPUTS:
+    radar = The original radar object with its fields converted.
+    """
+    for field in radar.fields.values():
+        field['data'] = as_field_dtype(field['data'])
+    return radar
@@ -17,9 +17,14 @@ import string
 import sys
 import time
 import numpy as np
+import scipy.ndimage as spyi
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+import precision
+import temporal_dealias
 
 def dealias(radar, filename, outpath, name2dealias, new_name, nyquist_vel, 
-            skip_along_ray, skip_between_rays, savefile=True):
+            skip_along_ray, skip_between_rays, savefile=True, temporal=False, max_age=900):
     """
     DESCRIPTION: Dealiases a specified field using the PyART
         dealiased_region_based function and can save off a separate cfradial 
@@ -34,7 +39,8 @@ def dealias(radar, filename, outpath, name2dealias, new_name, nyquist_vel,
     name2dealias = A string that specifies which field in the radar object to
         dealias.
     new_name = A string specifying the name of the new dealiased field.
-    nyquist_value = Numeric interger.
+    nyquist_vel = Numeric value or None. Nyquist velocity used for sweeps whose Nyquist velocity
+        is not recorded in the file (see get_sweep_nyquist). Each sweep is dealiased with its own value.
     skip_along_ray = Integer value. Maximum number of filtered gates to skip
         over when joining regions, gaps between region larger than this will 
         not be connected.  Parameters specify the maximum number of filtered 
@@ -49,25 +55,38 @@ def dealias(radar, filename, outpath, name2dealias, new_name, nyquist_vel,
     OPTIONAL INPUTS:
     savefile = Default set to True. A boolean value. If True, will save a new 
         cfradial file containing the dealiased field. 
+    temporal = Default set to False. A boolean value. If True, each region of the dealiased
+        field is checked against the previous volume from the same radar and tilt, and moved to the
+        Nyquist interval closest to it (see temporal_dealias).
+    max_age = Default set to 900. Previous volumes older than this many seconds are not used
+        when temporal is True.
     
     OUTPUTS:
     radar = A python object structure that contains radar information with the 
         addition of the new dealiased field.
     """
     
+    # Nyquist velocity of each sweep, from the file where available
+    sweep_nyquist = get_sweep_nyquist(radar, nyquist_vel)
+    
     # Determine which sweeps have no data and extract only the ones that have data 
-    if nyquist_vel != None:
-        good = []
-        print("Dealiasing in progress!")
-        for i in range(radar.nsweeps):
-            sweep = radar.get_slice(i)
-            if radar.fields[name2dealias]['data'][sweep][0,:].flatten().count() != 0:
-                good.append(i)
+    good = []
+    print("Dealiasing in progress!")
+    for i in range(radar.nsweeps):
+        sweep = radar.get_slice(i)
+        if radar.fields[name2dealias]['data'][sweep][0,:].flatten().count() != 0:
+            good.append(i)
+    if len(good) < radar.nsweeps:
         radar = radar.extract_sweeps(good)
+        if sweep_nyquist is not None:
+            sweep_nyquist = sweep_nyquist[good]
     
     # Dealias and add new dealiased field to radar object    
-    corr_vel = pyart.correct.dealias_region_based(radar,vel_field=name2dealias,nyquist_vel=nyquist_vel,skip_along_ray=skip_along_ray,skip_between_rays=skip_between_rays,gatefilter=False,keep_original=False)
+    corr_vel = pyart.correct.dealias_region_based(radar,vel_field=name2dealias,nyquist_vel=sweep_nyquist,skip_along_ray=skip_along_ray,skip_between_rays=skip_between_rays,gatefilter=False,keep_original=False)
+    corr_vel['data'] = precision.as_field_dtype(corr_vel['data'])
     radar.add_field(new_name, corr_vel, True)
+    if temporal:
+        radar = temporal_dealias.correct(radar, new_name, sweep_nyquist, max_age)
     print("Dealiasing complete in current file!")
        
     # Save a new file containing the dealiased field
@@ -80,6 +99,52 @@ def dealias(radar, filename, outpath, name2dealias, new_name, nyquist_vel,
         
     return radar
     
+# Per-sweep Nyquist velocities already found in this process, keyed on the scan pattern (see get_sweep_nyquist)
+_NYQUIST_CACHE = {}
+
+def get_sweep_nyquist(radar, default=None):
+    """
+    DESCRIPTION: Finds the Nyquist velocity of every sweep. Values are read from the radar's instrument
+        parameters (filled in by the PyART readers, e.g. from NEXRADLevel2File.get_nyquist_vel) and
+        cached per scan pattern (the NEXRAD VCP number, or the list of sweep angles for other radars),
+        so later volumes with the same pattern but missing values reuse them.
+    
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    
+    OPTIONAL INPUTS:
+    default = Default set to None. Nyquist velocity (m/s) for sweeps with no recorded or cached value,
+        e.g. the nyquist_vel set in start_script.
+    
+    OUTPUTS:
+    sweep_nyquist = Array with one Nyquist velocity per sweep, or None if some sweep has no value at
+        all, in which case PyART estimates the Nyquist velocity itself.
+    """
+    sweep_nyquist = np.full(radar.nsweeps, np.nan)
+    for i in range(radar.nsweeps):
+        try:
+            nyquist = radar.get_nyquist_vel(i, check_uniform=False)
+        except LookupError:
+            break #Not recorded for this radar
+        if np.isfinite(nyquist) and nyquist > 0:
+            sweep_nyquist[i] = nyquist
+    
+    key = (radar.metadata.get('instrument_name'), radar.metadata.get('vcp_pattern'),
+           tuple(np.round(radar.fixed_angle['data'], 1).tolist()))
+    cached = _NYQUIST_CACHE.get(key)
+    found = np.isfinite(sweep_nyquist)
+    if found.all():
+        _NYQUIST_CACHE[key] = sweep_nyquist.copy()
+    elif cached is not None:
+        sweep_nyquist[~found] = cached[~found]
+    
+    if default is not None:
+        sweep_nyquist[~np.isfinite(sweep_nyquist)] = default
+    if np.isnan(sweep_nyquist).any():
+        return None #Let PyART determine the Nyquist velocity for the whole volume
+    return sweep_nyquist
+
 def set2range(radar, field, val_max, val_min):
     """
     DESCRIPTION: Finds instances where a value is out side of the specified 
@@ -147,44 +212,232 @@ def removeNoiseZ(radar, radar_fieldnames, Z_min, Z_max):
     
     return radar
 
-def removeMountainClutter(radar, radar_fieldnames):
+# Names used for the same quantity by the supported radars, in order of preference
+FIELD_ALIASES = {
+        'reflectivity': ['reflectivity', 'corrected_reflectivity', 'DBZH', 'DBZ'],
+        'velocity': ['dealiased_velocity', 'PyART_dealiased_velocity', 'corrected_velocity',
+                     'velocity', 'mean_doppler_velocity', 'VEL'],
+        }
+
+def find_field(radar, kind):
+    """
+    DESCRIPTION: Finds the name of a field in the radar object from its kind, whatever naming the
+        radar uses (e.g. 'dealiased_velocity' for CHILL, 'PyART_dealiased_velocity' for KASPR).
+    
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    kind = A key of FIELD_ALIASES, e.g. 'velocity'.
+    
+    OUTPUTS:
+    field_name = The first name in FIELD_ALIASES[kind] that is in radar.fields.
+    """
+    for field_name in FIELD_ALIASES[kind]:
+        if field_name in radar.fields:
+            return field_name
+    raise KeyError('No %s field in radar object (tried %s)' % (kind, ', '.join(FIELD_ALIASES[kind])))
+
+def window_stats(data, valid, half_rays, half_gates, wrap_rays=False):
+    """
+    DESCRIPTION: Mean and variance of the valid gates in a moving (2*half_rays+1) x (2*half_gates+1)
+        window centered on each gate. Uses integral images (2-D cumulative sums), so the cost does not
+        depend on the window size.
+    
+    INPUTS:
+    data = 2-D array (rays x gates).
+    valid = Boolean array of the same shape, True where data can be used.
+    half_rays = Number of rays on each side of the center ray.
+    half_gates = Number of gates on each side of the center gate.
+    
+    OPTIONAL INPUTS:
+    wrap_rays = Default set to False. If True, the first and last rays are treated as neighbours
+        (a full PPI sweep). Otherwise windows are cut short at the edges.
+    
+    OUTPUTS:
+    mean = Window mean (NaN where the window has no valid gates).
+    var = Window variance.
+    count = Number of valid gates in each window.
+    """
+    offset = np.mean(data[valid]) if valid.any() else 0 #Centering keeps the sums of squares accurate
+    x = np.where(valid, data - offset, 0).astype(np.float64)
+    w = valid.astype(np.float64)
+    nrays = data.shape[0]
+    pad = half_rays if (wrap_rays and nrays > 2*half_rays) else 0
+    if pad:
+        x = np.concatenate([x[-pad:], x, x[:pad]])
+        w = np.concatenate([w[-pad:], w, w[:pad]])
+    
+    rows = np.arange(pad, pad + nrays)
+    cols = np.arange(data.shape[1])
+    r0 = np.maximum(rows - half_rays, 0)[:, np.newaxis]
+    r1 = np.minimum(rows + half_rays + 1, x.shape[0])[:, np.newaxis]
+    c0 = np.maximum(cols - half_gates, 0)
+    c1 = np.minimum(cols + half_gates + 1, x.shape[1])
+    
+    def box_sum(a):
+        integral = np.zeros((a.shape[0] + 1, a.shape[1] + 1))
+        np.cumsum(np.cumsum(a, axis=0), axis=1, out=integral[1:, 1:])
+        return integral[r1, c1] - integral[r0, c1] - integral[r1, c0] + integral[r0, c0]
+    
+    count = box_sum(w)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = box_sum(x)/count
+        var = np.maximum(box_sum(x*x)/count - mean**2, 0)
+    return mean + offset, var, count
+
+def classify_clutter(radar, Z_min=25, v_max=0.2, texture_min=3., half_rays=1, half_gates=2):
+    """
+    DESCRIPTION: Flags ground clutter: gates with high reflectivity, near-zero velocity, and a rough
+        reflectivity texture (standard deviation of Z in a small window). Weather that happens to have
+        zero radial velocity is usually smooth, so the texture test keeps it.
+    
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    
+    OPTIONAL INPUTS:
+    Z_min = Default set to 25. Minimum reflectivity (dBZ) of clutter.
+    v_max = Default set to 0.2. Maximum absolute velocity (m/s) of clutter.
+    texture_min = Default set to 3. Minimum standard deviation of reflectivity (dB) in the window.
+        Set to 0 to use only reflectivity and velocity, as in earlier versions of removeMountainClutter.
+    half_rays = Default set to 1. Texture window half-size in rays.
+    half_gates = Default set to 2. Texture window half-size in gates.
+    
+    OUTPUTS:
+    clutter = Boolean array (rays x gates), True at clutter gates.
+    """
+    Z = radar.fields[find_field(radar, 'reflectivity')]['data']
+    vel = radar.fields[find_field(radar, 'velocity')]['data']
+    Z_valid = ~np.ma.getmaskarray(Z) & np.isfinite(np.ma.getdata(Z))
+    Z = np.ma.getdata(Z)
+    vel_data = np.ma.getdata(vel)
+    
+    with np.errstate(invalid='ignore'):
+        clutter = Z_valid & (Z > Z_min) & ~np.ma.getmaskarray(vel) & (np.abs(vel_data) < v_max)
+    if texture_min > 0:
+        wrap = radar.scan_type == 'ppi'
+        for start, end in zip(radar.sweep_start_ray_index['data'], radar.sweep_end_ray_index['data']):
+            sweep = slice(start, end + 1)
+            if clutter[sweep].any():
+                var = window_stats(Z[sweep], Z_valid[sweep], half_rays, half_gates, wrap)[1]
+                clutter[sweep] &= var >= texture_min**2
+    return clutter
+
+def removeMountainClutter(radar, radar_fieldnames, clutter_mask=None, decided=None, **kwargs):
     """
     DESCRIPTION: Attempts to kill the friggin mountains!! Removes return that has high reflectivity
-    but near-zero velocity. Works surprisingly well in winter storms.
+    but near-zero velocity and a rough texture (see classify_clutter). Works surprisingly well in winter storms.
     
     INPUTS:
     radar = A python object structure that contains radar information. Created
         by PyART in one of the pyart.io.read functions.
     radar_fieldnames = Names of fields in the radar object
     
+    OPTIONAL INPUTS:
+    clutter_mask = Default set to None. Boolean array (rays x gates) of gates to remove, e.g. from a
+        static clutter map (see clutter_map). If None, clutter is found with classify_clutter.
+    decided = Default set to None. Boolean array (rays x gates) of the gates clutter_mask decides
+        (see clutter_map.get_mask). Other gates are checked with classify_clutter. If None, clutter_mask
+        is used for every gate.
+    kwargs = Thresholds passed to classify_clutter.
+    
     OUTPUTS:
     radar = The original radar object but with the edited values for the 
         specified field.
         
     """
-    # Check to see if values are in range
-    Z_max = 25
-    
-    slow = (radar.fields['dealiased_velocity']['data'].data < 0.2)
-    slow2 = (radar.fields['dealiased_velocity']['data'].data > -0.2)
-    near_stationary = [slow & slow2]
-    highz = (radar.fields['reflectivity']['data'].data > Z_max)
-    mountainIndices = [near_stationary & highz]
-    shapeOfData = np.array(radar.fields['reflectivity']['data'].data.shape)
-    mountainIndices = np.reshape(mountainIndices,[shapeOfData[0],shapeOfData[1]])
-    
-    # Troubleshooting
-    #print radar_fieldnames
-    #print radar.fields #If you suspect the data is blank, uncomment this to print a sample to the console
+    if clutter_mask is None:
+        clutter_mask = classify_clutter(radar, **kwargs)
+    elif decided is not None and not decided.all():
+        clutter_mask = np.where(decided, clutter_mask, classify_clutter(radar, **kwargs))
     
     for field in radar_fieldnames:
         try:
-            radar.fields[field]['data'].data[mountainIndices] = None
+            radar.fields[field]['data'].data[clutter_mask] = None
         except NotImplementedError:
-            radar.fields[field]['data'][mountainIndices] = None #For calculated fields like Rasmussen snow rate
+            radar.fields[field]['data'][clutter_mask] = None #For calculated fields like Rasmussen snow rate
+    
+    return radar
+
+def despeckle(radar, radar_fieldnames, field, min_size=10, diagonal=True):
+    """
+    DESCRIPTION: Removes speckles: connected regions of valid gates in a field that are smaller than
+    min_size gates. Regions are found per sweep with connected-component labeling; in full PPI sweeps,
+    regions touching the first and last rays are joined across the wrap in azimuth. Isolated noisy
+    gates otherwise become many tiny regions for the region-based dealiaser, so this should run before
+    dealias.
+    
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    radar_fieldnames = Names of fields in the radar object. Speckle gates are removed from all of them.
+    field = Name of the field used to find speckles, usually the velocity field to be dealiased.
+    
+    OPTIONAL INPUTS:
+    min_size = Default set to 10. Regions with fewer gates than this are removed.
+    diagonal = Default set to True. If True, gates touching at a corner belong to the same region.
+    
+    OUTPUTS:
+    radar = The original radar object but with the speckles removed from the specified fields.
+        
+    """
+    data = radar.fields[field]['data']
+    valid = ~np.ma.getmaskarray(data) & np.isfinite(np.ma.getdata(data))
+    speckle = np.zeros(valid.shape, dtype=bool)
+    structure = np.ones((3,3)) if diagonal else None
+    
+    for start, end in zip(radar.sweep_start_ray_index['data'], radar.sweep_end_ray_index['data']):
+        sweep = slice(start, end + 1)
+        labels, nlabels = spyi.label(valid[sweep], structure=structure)
+        if nlabels == 0:
+            continue
+        if radar.scan_type == 'ppi' and _full_circle(radar.azimuth['data'][sweep]):
+            labels = _join_wrapped_labels(labels, nlabels, diagonal)
+        sizes = np.bincount(labels.ravel())
+        small = sizes < min_size
+        small[0] = False #Label 0 is the invalid gates
+        speckle[sweep] = small[labels]
+    
+    for field_name in radar_fieldnames:
+        data = radar.fields[field_name]['data']
+        if np.ma.isMaskedArray(data):
+            data[speckle] = np.ma.masked
+        else:
+            data[speckle] = np.nan #For calculated fields stored as plain arrays
     
     return radar
 
+def _full_circle(azimuth):
+    """
+    DESCRIPTION: True if the rays of a sweep go all the way around, so the last ray neighbours the first.
+    """
+    if azimuth.size < 3:
+        return False
+    spacing = np.median(np.abs((np.diff(azimuth) + 180) % 360 - 180))
+    wrap_gap = abs((azimuth[0] - azimuth[-1] + 180) % 360 - 180)
+    return wrap_gap <= 1.5*spacing
+
+def _join_wrapped_labels(labels, nlabels, diagonal):
+    """
+    DESCRIPTION: Merges the labels of regions that touch across the first and last rays of a sweep.
+    """
+    first = labels[0]
+    last = labels[-1]
+    pairs = [(first, last)]
+    if diagonal:
+        pairs += [(first[1:], last[:-1]), (first[:-1], last[1:])]
+    a = np.concatenate([p[0] for p in pairs])
+    b = np.concatenate([p[1] for p in pairs])
+    touching = (a > 0) & (b > 0)
+    if not touching.any():
+        return labels
+    graph = csr_matrix((np.ones(touching.sum()), (a[touching], b[touching])), shape=(nlabels + 1, nlabels + 1))
+    merged = connected_components(graph, directed=False)[1]
+    merged[0] = -1
+    # Renumber so the invalid gates stay 0 and merged regions share one label
+    merged = np.unique(merged, return_inverse=True)[1]
+    return merged.reshape(-1)[labels]
+
 def removeNoiseZdr(radar, radar_fieldnames, Zdr_min, Zdr_max):
     """
     DESCRIPTION: Removes data across all variables corresponding to noisy Zdr values.
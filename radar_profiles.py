@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Registry of radar profiles. A profile holds everything that differs between radars: how
+the files are read, how to recognize them, how to read the scan time from the file name, and the default
+fields, ranges, colormaps, dealiasing names, and QC settings. start_script.py builds one run
+configuration per profile, and each file is matched to a profile from the first bytes of the file, so
+one run can process files from different radars.
+Contains:
+    register
+    detect
+    match
+    match_name
+    run_settings
+    file_nyquist
+    filename_time
+    get_colormap
+
+To add a radar, register a new profile below. To change a setting for one radar in a single run, use
+profile_overrides in start_script.py.
+
+Version date: 10/19/2026
+"""
+
+import bz2
+from collections.abc import Mapping
+import datetime
+import gzip
+from functools import lru_cache
+import colormap
+
+# name: {'wildcards': file name patterns of the radar, 'header': callable(first bytes of the file) -> bool,
+#        'reader': pyart.io function name, 'field_names': field name mapping passed to the reader,
+#        'time_position': (start of YYYYMMDD, start of HHMMSS) in the file name,
+#        'settings': default run settings, see run_settings}
+PROFILES = {}
+
+HEADER_BYTES = 32 #Bytes read from each file to recognize it
+
+# Colormaps made by the colormap module, by the names used in profile settings. Any other name is
+# passed to matplotlib.
+COLORMAPS = {
+    'LCH': lambda: colormap.cached_LCH_Spiral(),
+    'LCH_zdr': lambda: colormap.cached_LCH_Spiral(nc = 100, np = .3, offset = 0, reverse = 1, L_range = [100, 0], name = 'LCH_zdr'),
+    'LCH_wid': lambda: colormap.cached_LCH_Spiral(nc = 100, np = .3, offset = 45, reverse = 0, L_range = [100, 0], name = 'LCH_wid'),
+    'PID': lambda: colormap.PID_Integer(),
+    'PID_CHILL': lambda: colormap.PID_Integer_CHILL(),
+    'cuckoo': lambda: colormap.cuckoo(),
+    }
+
+def register(name, wildcards, header, settings, reader='read', field_names=None, time_position=None,
+             name_required=False):
+    """
+    DESCRIPTION: Adds a radar profile to the registry, replacing any existing profile with the same name.
+
+    INPUTS:
+    name = Name of the profile, used as radar_type throughout the toolkit, e.g. 'KASPR'.
+    wildcards = List of strings found in the radar's file names, e.g. ['CHL','CHX'].
+    header = Function that takes the first HEADER_BYTES bytes of a file (decompressed) and returns
+        True if the file could come from this radar.
+    settings = Dictionary of default run settings: fields, ranges, cmaps, colorbar_labels, x_lim and
+        y_lim (used for PPIs), name2dealias, new_name, nyquist_vel, Zdr_offset, mountain_clutter_bool,
+        kdp_bool, edr_bool. nyquist_vel may be a dictionary keyed by wildcard (see file_nyquist).
+
+    OPTIONAL INPUTS:
+    reader = Default set to 'read'. Name of the pyart.io function used to read the files.
+    field_names = Default set to None. Field name mapping passed to the reader.
+    time_position = Default set to None. Tuple of the positions of YYYYMMDD and HHMMSS in the file name.
+    name_required = Default set to False. Set to True when the header test also accepts files from
+        other radars (e.g. any netCDF file), so a file is only given this profile if its name also
+        contains one of the wildcards.
+    """
+    PROFILES[name] = {'wildcards': list(wildcards), 'header': header, 'reader': reader,
+                      'field_names': field_names, 'time_position': time_position, 'settings': settings,
+                      'name_required': name_required}
+
+def detect(fqfn, default='NEXRAD'):
+    """
+    DESCRIPTION: Finds the profile of a radar file from its first bytes. When several profiles accept
+        the header (or none do), the file name is matched against the profiles' wildcards. Profiles
+        registered with name_required only match files whose name contains one of their wildcards.
+
+    INPUTS:
+    fqfn = Full path of the file.
+
+    OPTIONAL INPUTS:
+    default = Default set to 'NEXRAD'. Profile used when nothing matches.
+
+    OUTPUTS:
+    radar_type = Name of the profile.
+    """
+    radar_type = match(fqfn)
+    if radar_type is None:
+        print("WARNING: Unknown radar type for %s! Processing with %s settings to give best chance of success." % (fqfn, default))
+        radar_type = default
+    return radar_type
+
+def match(fqfn):
+    """
+    DESCRIPTION: Same as detect, but returns None for files that match no profile (e.g. images or
+        text files in the data directory).
+    """
+    first_bytes = _read_header(fqfn)
+    candidates = [name for name, profile in PROFILES.items() if profile['header'](first_bytes)]
+    named = match_name(fqfn.replace('\\', '/').split('/')[-1], candidates or None)
+    if named is not None:
+        return named
+    # Without a name match, only trust header tests that no other radar's files pass
+    for name in candidates:
+        if not PROFILES[name]['name_required']:
+            return name
+    return None
+
+def match_name(filename, names=None):
+    """
+    DESCRIPTION: Finds the profile of a file from its name alone, without opening it.
+
+    INPUTS:
+    filename = Name of the file.
+
+    OPTIONAL INPUTS:
+    names = Default set to None, which checks every profile. List of the profiles to check.
+
+    OUTPUTS:
+    radar_type = Name of the first profile with a wildcard in filename, or None.
+    """
+    for name in names or PROFILES:
+        if any(wildcard in filename for wildcard in PROFILES[name]['wildcards']):
+            return name
+    return None
+
+def run_settings(name, scan_strat, overrides=None):
+    """
+    DESCRIPTION: Run settings of a profile, ready for run_config.make_config.
+
+    INPUTS:
+    name = Name of the profile.
+    scan_strat = 'PPI', 'RHI', or 'Sector'. RHIs use the same plot limits for every radar.
+
+    OPTIONAL INPUTS:
+    overrides = Default set to None. Dictionary of settings that replace the profile's defaults.
+
+    OUTPUTS:
+    settings = Dictionary including radar_type, with colormap names replaced by colormaps. A
+        nyquist_vel dictionary is kept as it is; see file_nyquist.
+    """
+    settings = dict(PROFILES[name]['settings'])
+    settings.update(overrides or {})
+    settings['radar_type'] = name
+    if scan_strat == 'RHI':
+        settings.setdefault('rhi_x_lim', [-30,30])
+        settings.setdefault('rhi_y_lim', [0,12])
+        settings['x_lim'] = settings['rhi_x_lim']
+        settings['y_lim'] = settings['rhi_y_lim']
+    settings.pop('rhi_x_lim', None)
+    settings.pop('rhi_y_lim', None)
+    settings['cmaps'] = [get_colormap(cmap) for cmap in settings['cmaps']]
+    return settings
+
+def file_nyquist(nyquist_vel, filename):
+    """
+    DESCRIPTION: Nyquist velocity setting for one file. Profiles whose files differ in Nyquist velocity
+        (e.g. S-band and X-band CHILL) set nyquist_vel to a dictionary keyed by wildcard.
+
+    INPUTS:
+    nyquist_vel = Numeric value, None, or dictionary of {wildcard: value}.
+    filename = Name of the file.
+
+    OUTPUTS:
+    nyquist_vel = Value for the first wildcard found in filename, None if none is found, or
+        nyquist_vel itself if it is not a dictionary.
+    """
+    if not isinstance(nyquist_vel, Mapping):
+        return nyquist_vel
+    for wildcard, value in nyquist_vel.items():
+        if wildcard in filename:
+            return value
+    return None
+
+def filename_time(name, filename):
+    """
+    DESCRIPTION: Reads the scan time from a file name, using the profile's time_position.
+
+    INPUTS:
+    name = Name of the profile.
+    filename = Name of the file.
+
+    OUTPUTS:
+    time = datetime.datetime, or None if the profile has no time_position or the name does not match.
+    """
+    position = PROFILES[name]['time_position']
+    if position is None:
+        return None
+    date_start, time_start = position
+    try:
+        return datetime.datetime.strptime(filename[date_start:date_start + 8] + filename[time_start:time_start + 6],
+                                          '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+
+def get_colormap(cmap):
+    """
+    DESCRIPTION: Returns the colormap for a name in COLORMAPS, made once per process. Other names and
+        colormap objects are returned unchanged.
+    """
+    if isinstance(cmap, str) and cmap in COLORMAPS:
+        return _made_colormap(cmap)
+    return cmap
+
+@lru_cache(maxsize=None)
+def _made_colormap(name):
+    """
+    DESCRIPTION: Cached body of get_colormap, so every profile shares one copy of each colormap.
+    """
+    return COLORMAPS[name]()
+
+def _read_header(fqfn):
+    """
+    DESCRIPTION: First HEADER_BYTES bytes of a file, decompressed if it is gzip or bzip2 compressed.
+    """
+    try:
+        with open(fqfn, 'rb') as f:
+            first_bytes = f.read(HEADER_BYTES)
+        if first_bytes[:2] == b'\x1f\x8b':
+            with gzip.open(fqfn, 'rb') as f:
+                first_bytes = f.read(HEADER_BYTES)
+        elif first_bytes[:3] == b'BZh':
+            with bz2.open(fqfn, 'rb') as f:
+                first_bytes = f.read(HEADER_BYTES)
+    except (OSError, EOFError):
+        first_bytes = b''
+    return first_bytes
+
+def _is_uf(first_bytes):
+    """ Universal Format, with or without a Fortran record length in front. """
+    return b'UF' in (first_bytes[0:2], first_bytes[2:4], first_bytes[4:6])
+
+def _is_netcdf(first_bytes):
+    """ netCDF3 or netCDF4 (HDF5). """
+    return first_bytes[:3] == b'CDF' or first_bytes[:4] == b'\x89HDF'
+
+def _is_nexrad_level2(first_bytes):
+    """ NEXRAD Level II archive. """
+    return first_bytes[:4] == b'AR2V' or first_bytes[:8] == b'ARCHIVE2'
+
+#CAUTION: DO NOT USE 'seismic' FOR VELOCITY DATA. 'seismic' is asymmetric around its zero value, which skews the apparent magnitude
+#of negative values relative to positive values. 'RdBu_r' is preferred.
+register('CHILL', ['CHL','CHX'], _is_uf, reader='read_uf', time_position=(3, 12),
+         #CHILL uses a specialized UF format that requires the keys to be designated manually
+         field_names={
+             'DZ': 'reflectivity',
+             'VE': 'corrected_velocity',
+             'W2': 'spectrum_width',
+             'DR': 'corrected_differential_reflectivity',
+             'RH': 'cross_correlation_ratio',
+             'NC': 'normalized_coherent_power',
+             'DP': 'one_way_differential_phase',
+             'KD': 'two_way_differential_phase',
+             },
+         settings={
+             'fields': ['reflectivity','dealiased_velocity','corrected_differential_reflectivity','spectrum_width','cross_correlation_ratio','normalized_coherent_power','one_way_differential_phase','two_way_differential_phase'],
+             'ranges': [(-5,25),(-20,20),(-1,2),(0,4),(0.4,1),(0,1),(-60,-120),(-1.5,1.5)], #CSU-CHILL (winter) X-band
+             #S-band (winter): [(-5,25),(-40,40),(-1,2),(0,8),(0.4,1),(0,1),(-30,-60),(-0.5,0.5)]
+             #Summer: [(-5,65),(-40,40),(-3,5),(0,8),(0.5,1),(0,1),(-5,5)]
+             'cmaps': ['LCH','RdBu_r','LCH_zdr','LCH_wid','bone_r','copper','magma','cuckoo'],
+             'colorbar_labels': ['DBZ (dBZ)','V (m/s)','ZDR (dB)','Width (m/s)','rhoHV','NCP','PhiDP (deg)','KDP (deg/km)'],
+             'x_lim': [-60,60],
+             'y_lim': [-60,60],
+             'rhi_x_lim': [-30,30], #Max X-band RHI range: [0,75]
+             'rhi_y_lim': [0,12], #Summer: [0,16]
+             'name2dealias': 'corrected_velocity',
+             'new_name': 'dealiased_velocity',
+             'nyquist_vel': {'CHL': 27.5039, 'CHX': 25.893}, #S-band, X-band
+             'Zdr_offset': {"bool": False, "offset": 0.0},
+             'mountain_clutter_bool': True, #Remove mountain clutter from CHILL data automatically
+             'kdp_bool': True,
+             'edr_bool': True,
+             })
+
+register('KASPR', ['KASPR'], _is_netcdf, time_position=(17, 26), name_required=True, #Any CF/Radial file is netCDF
+         settings={
+             'fields': ['correlation_coefficient','differential_reflectivity','PyART_dealiased_velocity','reflectivity','spectrum_width','linear_depolarization_ratio','snr'],
+             'ranges': [(0.5,1),(-2,2),(-45,45),(-20,30),(0,3),(-40,-20),(0,100)], #KASPR (commonly-used) (winter)
+             'cmaps': ['bone_r','LCH_zdr','RdBu_r','LCH','LCH_wid','inferno','copper'],
+             'colorbar_labels': ['rhoHV','Zdr (dB)','V (m/s)','Z (dBZ)','Spectral Width (m/s)','LDR (dB)','SNR'],
+             'x_lim': [-30,30],
+             'y_lim': [-30,30],
+             'name2dealias': 'mean_doppler_velocity_folded',
+             'new_name': 'PyART_dealiased_velocity',
+             'nyquist_vel': 9.999,
+             'Zdr_offset': {"bool": True, "offset": 1.2},
+             'mountain_clutter_bool': False, #No mountains in New York City!
+             'kdp_bool': False,
+             'edr_bool': True,
+             })
+
+register('NEXRAD', ['KCYS','KFTG'], _is_nexrad_level2, time_position=(4, 13),
+         settings={
+             'fields': ['reflectivity','dealiased_velocity','spectrum_width','cross_correlation_ratio','differential_reflectivity'],
+             'ranges': [(-5,40),(-45,45),(0,3),(0.5,1),(-2,2)],
+             'cmaps': ['LCH','RdBu_r','LCH_wid','bone_r','LCH_zdr'],
+             'colorbar_labels': ['DBZ (dBZ)','V (m/s)','Width (m/s)','rhoHV','Zdr (dB)'],
+             'x_lim': [-175,175],
+             'y_lim': [-175,175],
+             'name2dealias': 'velocity',
+             'new_name': 'dealiased_velocity',
+             'nyquist_vel': 26.389, #KCYS 2018 02 01. Only used for sweeps without a Nyquist velocity in the file; varies by VCP
+             'Zdr_offset': {"bool": False, "offset": 0.0},
+             'mountain_clutter_bool': True, #Needs to be set manually
+             'kdp_bool': True,
+             'edr_bool': False,
+             })
+
+#HF-S (not fully implemented): fields ['DBZH','DBZV','ZDR','RHOHV','PHIDP','SNRHC','SNRVC','dealiasVELH'],
+# ranges [(0,60),(0,60),(-20,0),(0,1),(0,180),(0,1),(0,1),(-40,40)], cmaps ['LCH','LCH','LCH_zdr','bone_r','cividis','copper','copper','RdBu_r'],
+# x_lim/y_lim [-375,375], name2dealias 'VELH', new_name 'dealiasVELH', nyquist_vel 8.5048, Zdr_offset applies
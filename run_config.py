@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Settings for a processing run, gathered into one immutable object. start_script.py builds
+the configuration once with make_config, which checks it, and hands it to each worker when the worker
+starts, so jobs only need to carry a filename. Lists become tuples and settings dictionaries become
+read-only, so nothing a file does can change the settings used for the next one. The configuration is
+hashable, and RunConfig.processing_key gives a short name for the processing settings that is the same
+in every process, used in the names of processed volume caches (see volume_cache).
+Contains:
+    RunConfig
+    make_config
+    freeze
+
+Version date: 10/19/2026
+"""
+
+import hashlib
+from collections import namedtuple
+from collections.abc import Mapping
+import numpy as np
+
+# Every setting of a run, in the order they are defined in start_script.py
+SETTINGS = ('inpath', 'outpath', 'radar_type', 'fields', 'ranges', 'plot_bool', 'cmaps', 'colorbar_labels',
+            'x_lim', 'y_lim', 'scan_strat', 'dealias_bool', 'save_cfradial_bool', 'volume_cache_bool', 'raw_cache',
+            'name2dealias', 'new_name', 'nyquist_vel', 'temporal_dealias_settings', 'Z_mask', 'Zdr_mask',
+            'PhiDP_mask', 'rhoHV_mask', 'NCP_mask', 'SNR_mask', 'despeckle_settings', 'Zdr_offset',
+            'snow_rate_bool', 'vdiv_bool', 'edr_settings', 'kdp_bool', 'edr_bool', 'mountain_clutter_bool', 'clutter_map_settings',
+            'contour_bool', 'base_field', 'contour_field', 'contour_levels', 'azi_overlay')
+# Settings that change the processed (QC'd and dealiased) volume, see RunConfig.processing_key
+PROCESSING_SETTINGS = ('radar_type', 'fields', 'dealias_bool', 'name2dealias', 'new_name', 'nyquist_vel',
+                       'temporal_dealias_settings', 'Z_mask', 'Zdr_mask', 'PhiDP_mask', 'rhoHV_mask', 'NCP_mask',
+                       'SNR_mask', 'despeckle_settings', 'Zdr_offset')
+MASKS = ('Z_mask', 'Zdr_mask', 'PhiDP_mask', 'rhoHV_mask', 'NCP_mask', 'SNR_mask')
+SWITCHES = MASKS + ('raw_cache', 'temporal_dealias_settings', 'despeckle_settings', 'Zdr_offset',
+                    'clutter_map_settings', 'azi_overlay')
+SCAN_STRATS = ('PPI', 'RHI', 'Sector', 'sector')
+# Derived fields (see derived_fields) switched on by each setting, in plotting order
+DERIVED_SWITCHES = (('snow_rate_bool', 'snow_rate'), ('vdiv_bool', 'vdiv'), ('kdp_bool', 'kdp_lsq'), ('edr_bool', 'edr'))
+
+class FrozenDict(Mapping):
+    """
+    DESCRIPTION: Read-only, hashable dictionary used for settings such as Z_mask. Read it like a
+        dictionary, e.g. Z_mask['bool'].
+    """
+    __slots__ = ('_items',)
+
+    def __init__(self, items):
+        object.__setattr__(self, '_items', dict(items))
+
+    def __getitem__(self, key):
+        return self._items[key]
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __hash__(self):
+        return hash(_canonical(self))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('FrozenDict is read-only')
+
+    def __reduce__(self):
+        return (FrozenDict, (self._items,))
+
+    def __repr__(self):
+        return 'FrozenDict(%r)' % (self._items,)
+
+class RunConfig(namedtuple('RunConfig', SETTINGS)):
+    """
+    DESCRIPTION: Immutable settings of a processing run. Create with make_config. Settings are read as
+        attributes, e.g. config.dealias_bool or config.Z_mask['range'].
+    """
+    __slots__ = ()
+
+    def __hash__(self):
+        return hash(_canonical(self))
+
+    def __eq__(self, other):
+        return isinstance(other, RunConfig) and _canonical(self) == _canonical(other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    @property
+    def processing_key(self):
+        """ Short name for the settings that change the processed volume (QC and dealiasing). """
+        return _digest(tuple((name, _canonical(getattr(self, name))) for name in PROCESSING_SETTINGS))
+
+    @property
+    def qc_fields(self):
+        """ Fields masked during QC. When dealiasing, the dealiased field is not made yet, so the
+        folded field is masked in its place. """
+        if not self.dealias_bool:
+            return list(self.fields)
+        qc_fields = [self.name2dealias if field == self.new_name else field for field in self.fields]
+        if self.name2dealias not in qc_fields:
+            qc_fields.append(self.name2dealias)
+        return qc_fields
+
+    @property
+    def derived(self):
+        """ Names of the derived fields switched on, in plotting order. """
+        return [name for switch, name in DERIVED_SWITCHES if getattr(self, switch)]
+
+    @property
+    def derived_options(self):
+        """ Keyword arguments for the derived field functions, by field name (see derived_fields.attach). """
+        return {'edr': self.edr_settings}
+
+    def plot_settings(self):
+        """ New lists of fields, ranges, cmaps, and colorbar_labels for one file, which can be extended
+        without changing the configuration. """
+        return list(self.fields), list(self.ranges), list(self.cmaps), list(self.colorbar_labels)
+
+def make_config(**settings):
+    """
+    DESCRIPTION: Checks the settings of a run and freezes them into a RunConfig.
+
+    INPUTS:
+    settings = Every name in SETTINGS as a keyword argument, e.g. make_config(inpath=inpath, ...).
+
+    OUTPUTS:
+    config = RunConfig. Extra colormaps and colorbar labels beyond the number of fields are dropped,
+        so the ones added for derived fields line up.
+    """
+    missing = [name for name in SETTINGS if name not in settings]
+    unknown = [name for name in settings if name not in SETTINGS]
+    if missing or unknown:
+        raise TypeError('Missing settings: %s; unknown settings: %s' % (missing, unknown))
+
+    for name in SWITCHES:
+        if 'bool' not in settings[name]:
+            raise ValueError('%s needs a "bool" entry' % name)
+    for name in MASKS:
+        if len(settings[name]['range']) != 2:
+            raise ValueError('%s range must be (min, max)' % name)
+    if settings['scan_strat'] not in SCAN_STRATS:
+        raise ValueError('Unknown scan_strat %r, use one of %s' % (settings['scan_strat'], SCAN_STRATS))
+
+    nfields = len(settings['fields'])
+    if settings['plot_bool']:
+        if len(settings['ranges']) < nfields:
+            raise IndexError('Check number of fields and ranges!')
+        if len(settings['cmaps']) < nfields or len(settings['colorbar_labels']) < nfields:
+            raise IndexError('Check number of colormaps and colorbars!')
+    settings['ranges'] = settings['ranges'][:nfields]
+    settings['cmaps'] = settings['cmaps'][:nfields]
+    settings['colorbar_labels'] = settings['colorbar_labels'][:nfields]
+
+    config = RunConfig(**dict((name, freeze(value)) for name, value in settings.items()))
+    return config
+
+def freeze(value):
+    """
+    DESCRIPTION: Read-only copy of a setting: lists and arrays become tuples and dictionaries become
+        FrozenDicts, all the way down. Other values (numbers, strings, colormaps) are kept as they are.
+    """
+    if isinstance(value, Mapping):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return tuple(freeze(item) for item in value)
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+def _canonical(value):
+    """
+    DESCRIPTION: Hashable stand-in for a frozen setting. Colormap objects cannot be hashed, so they are
+    represented by their name.
+    """
+    if isinstance(value, Mapping):
+        return tuple(sorted((key, _canonical(item)) for key, item in value.items()))
+    if isinstance(value, tuple):
+        return tuple(_canonical(item) for item in value)
+    if hasattr(value, 'name') and hasattr(value, 'N'):
+        return ('colormap', value.name, value.N)
+    return value
+
+def _digest(canonical):
+    """
+    DESCRIPTION: Short hex name for a canonical setting. Python's hash() of strings changes between
+    processes, so names shared between workers are built with hashlib instead.
+    """
+    return hashlib.sha1(repr(canonical).encode('utf-8')).hexdigest()[:12]
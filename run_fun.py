@@ -17,120 +17,134 @@ import quality_control
 import Master_plotter
 import pyart
 import gc
+import os
 import sys
-import calculated_fields
+import clutter_map
+import decoded_cache
+import derived_fields
+import precision
+import radar_profiles
+import volume_cache
 #import colormap
 import time
 
-def parse_filelist(filelist, inpath, outpath, radar_type, fields, ranges, plot_bool, cmaps,
-                   colorbar_labels, x_lim, y_lim, scan_strat, dealias_bool, save_cfradial_bool,
-                   name2dealias, new_name, nyquist_vel, Z_mask, Zdr_mask, PhiDP_mask, rhoHV_mask,
-                   NCP_mask, SNR_mask, Zdr_offset, snow_rate_bool, vdiv_bool, mountain_clutter_bool, 
-                   contour_bool, base_field, contour_field, contour_levels, azi_overlay):
+def parse_filelist(filelist, config):
+    """
+    DESCRIPTION: Reads, quality controls, dealiases, and plots each file in a list.
+    
+    INPUTS:
+    filelist = List of file names in config.inpath, or a single file name.
+    config = run_config.RunConfig holding the settings of the run (see start_script.py).
+    """
+    c = config
+    # Fields masked during QC (the folded velocity stands in for the dealiased one)
+    qc_fields = c.qc_fields
     
     # Loop through each file in the list
     length_filelist = np.size(filelist)
         
     for item in range(0,length_filelist):
+        # Each file starts from fresh copies of the plot settings, so the derived fields added for
+        # one file do not carry over to the next
+        fields, ranges, cmaps, colorbar_labels = c.plot_settings()
+        
         # Define the filename
         filename = filelist[item]
         if length_filelist==1:
             filename = filelist
         
         # Make full path to file
-        fqfn = inpath + filename
+        fqfn = c.inpath + filename
         # Print the full path
         print(fqfn)
         
-        # Construct radar object
-        if radar_type=='CHILL':
-            #CHILL uses a specialized UF format that requires the keys to be designated manually
-            radar = pyart.io.read_uf(filename,field_names={
-                    'DZ': 'reflectivity',
-                    'VE': 'corrected_velocity',
-                    'W2': 'spectrum_width',
-                    'DR': 'corrected_differential_reflectivity',
-                    'RH': 'cross_correlation_ratio',
-                    'NC': 'normalized_coherent_power',
-                    'DP': 'one_way_differential_phase',
-                    'KD': 'two_way_differential_phase',
-                        })
-        else:
-            #Other radar file formats can be determined automatically
-            radar = pyart.io.read(fqfn)            
+        # Reuse the processed volume if a cache exists, skipping reading, QC, and dealiasing
+        # The cache name includes the QC and dealiasing settings, so changing them starts a new cache
+        cachename = volume_cache.get_cachename(c.outpath, filename, c.processing_key)
+        from_cache = c.volume_cache_bool and os.path.isfile(cachename)
         
-        if snow_rate_bool:
-            radar = calculated_fields.rasmussen_snow_rate(radar,fields)
-            ranges.append((0,1.25))
-            cmaps.append('viridis') #or YlGnBu
-            colorbar_labels.append('Snow rate (mm/hr)')
-      
-        # Data quality
-        if dealias_bool == False:
-            if Z_mask['bool'] == True:
-                radar = quality_control.removeNoiseZ(radar,fields,Z_mask['range'][0],Z_mask['range'][1])
-            if PhiDP_mask['bool'] == True:
-                radar = quality_control.removeNoisePhiDP(radar,fields,PhiDP_mask['range'][0],PhiDP_mask['range'][1])
-            if rhoHV_mask['bool'] == True:
-                radar = quality_control.removeNoiseRhoHV(radar,fields,rhoHV_mask['range'][0],rhoHV_mask['range'][1])
-            if NCP_mask['bool'] == True:
-                radar = quality_control.removeNoiseNCP(radar,fields,NCP_mask['range'][0],NCP_mask['range'][1])
-            if SNR_mask['bool'] == True:
-                radar = quality_control.removeNoiseSNR(radar,fields,SNR_mask['range'][0],SNR_mask['range'][1])
+        # Construct radar object
+        if from_cache:
+            radar = volume_cache.read_volume(cachename)
         else:
-            # Need to apply masks before dealiasing, but a KeyError occurs due to the mismatch between new_name and name2dealias
-            # Replace new_name with name2dealias
-            v_ind = fields.index(new_name)
-            fields.remove(new_name)
-            fields.insert(v_ind,name2dealias)
-            
-            #despeckler = pyart.correct.despeckle_field(radar,'corrected_velocity',threshold=(-40,40)) # someday
+            # The reader and field names come from the radar's profile (CHILL uses a specialized UF format
+            # that requires the keys to be designated manually, other formats are determined automatically)
+            profile = radar_profiles.PROFILES[c.radar_type]
+            reader = profile['reader']
+            field_names = profile['field_names']
             
-            if Z_mask['bool'] == True:
-                radar = quality_control.removeNoiseZ(radar,fields,Z_mask['range'][0],Z_mask['range'][1])
-            if Zdr_mask['bool'] == True:
-                radar = quality_control.removeNoiseZdr(radar,fields,Zdr_mask['range'][0],Zdr_mask['range'][1])
-            if PhiDP_mask['bool'] == True:
-                radar = quality_control.removeNoisePhiDP(radar,fields,PhiDP_mask['range'][0],PhiDP_mask['range'][1])
-            if rhoHV_mask['bool'] == True:
-                radar = quality_control.removeNoiseRhoHV(radar,fields,rhoHV_mask['range'][0],rhoHV_mask['range'][1])
-            if NCP_mask['bool'] == True:
-                radar = quality_control.removeNoiseNCP(radar,fields,NCP_mask['range'][0],NCP_mask['range'][1])
-            if SNR_mask['bool'] == True:
-                radar = quality_control.removeNoiseSNR(radar,fields,SNR_mask['range'][0],SNR_mask['range'][1])
-            
-            # Reverse the process
-            fields.remove(name2dealias)
-            fields.insert(v_ind,new_name)
+            if c.raw_cache['bool']:
+                #Decoded volumes are cached by file contents, so repeated runs skip decoding
+                radar = decoded_cache.read(fqfn, c.raw_cache['path'], reader, field_names, c.raw_cache['max_gb'])
+            elif field_names is not None:
+                radar = getattr(pyart.io, reader)(fqfn,field_names=field_names)
+            else:
+                radar = getattr(pyart.io, reader)(fqfn)
+        
+        # Keep all fields in the pipeline's working precision (float32 by default)
+        radar = precision.apply(radar)
+        
+        
+        if not from_cache:
+            # Data quality
+            if c.Z_mask['bool'] == True:
+                radar = quality_control.removeNoiseZ(radar,qc_fields,c.Z_mask['range'][0],c.Z_mask['range'][1])
+            if c.dealias_bool == True and c.Zdr_mask['bool'] == True: #The Zdr mask is only used when dealiasing
+                radar = quality_control.removeNoiseZdr(radar,qc_fields,c.Zdr_mask['range'][0],c.Zdr_mask['range'][1])
+            if c.PhiDP_mask['bool'] == True:
+                radar = quality_control.removeNoisePhiDP(radar,qc_fields,c.PhiDP_mask['range'][0],c.PhiDP_mask['range'][1])
+            if c.rhoHV_mask['bool'] == True:
+                radar = quality_control.removeNoiseRhoHV(radar,qc_fields,c.rhoHV_mask['range'][0],c.rhoHV_mask['range'][1])
+            if c.NCP_mask['bool'] == True:
+                radar = quality_control.removeNoiseNCP(radar,qc_fields,c.NCP_mask['range'][0],c.NCP_mask['range'][1])
+            if c.SNR_mask['bool'] == True:
+                radar = quality_control.removeNoiseSNR(radar,qc_fields,c.SNR_mask['range'][0],c.SNR_mask['range'][1])
+            if c.despeckle_settings['bool'] == True:
+                radar = quality_control.despeckle(radar,qc_fields,c.name2dealias,c.despeckle_settings['min_size'])
       
-        # Account for Zdr offset
-        if Zdr_offset['bool']:
-            radar.fields['differential_reflectivity']['data'].data[0:len(radar.fields['differential_reflectivity']['data'].data)] = np.subtract(radar.fields['differential_reflectivity']['data'].data,Zdr_offset['offset'])
+            # Account for Zdr offset
+            if c.Zdr_offset['bool']:
+                radar.fields['differential_reflectivity']['data'].data[0:len(radar.fields['differential_reflectivity']['data'].data)] = np.subtract(radar.fields['differential_reflectivity']['data'].data,c.Zdr_offset['offset'])
         
-        # Dealias velocity data
-        if dealias_bool == True:
-            radar = quality_control.dealias(radar, filename, outpath, name2dealias, new_name, nyquist_vel, 100, 100, save_cfradial_bool)
-            gc.collect()
+            # Dealias velocity data
+            if c.dealias_bool == True:
+                radar = quality_control.dealias(radar, filename, c.outpath, c.name2dealias, c.new_name, radar_profiles.file_nyquist(c.nyquist_vel, filename), 100, 100, c.save_cfradial_bool,
+                                                c.temporal_dealias_settings['bool'], c.temporal_dealias_settings['max_age'])
+                gc.collect()
+            
+            # Save the processed volume so later runs can skip straight to plotting
+            if c.volume_cache_bool:
+                volume_cache.write_volume(radar, cachename)
         
         print("Dealiasing complete!") #Dealiasing can take a while, this helps keep the user aware of PyART's progress.
         
-        # Add the vertical derivative of dealiased velocity. FOR RHI SCANS ONLY! vdiv cannot be calculated in this way for PPI/sector scans.
-        if scan_strat == 'PPI':
-            vdiv_bool = False
-        if vdiv_bool:
-            radar = calculated_fields.velocity_vertical_divergence(radar,fields)
-            ranges.append((0,2))
-            cmaps.append('inferno')
-            colorbar_labels.append('|vDiv| ms^(-1)/gate')
-        
         # Remove mountain clutter. Comes late in the process because it relies partly on dealiased velocity.
-        if mountain_clutter_bool:
-            radar = quality_control.removeMountainClutter(radar,fields)
+        # Derived fields are calculated from the cleaned fields, so they inherit the removed gates.
+        if c.mountain_clutter_bool:
+            clutter_mask = None
+            decided = None
+            if c.clutter_map_settings['bool']:
+                # Static clutter map for the site, built up from earlier volumes
+                if c.clutter_map_settings['update']:
+                    site_map = clutter_map.update_saved(c.clutter_map_settings['path'], radar)
+                else:
+                    site_map = clutter_map.load_cached(c.clutter_map_settings['path'])
+                    if site_map is None:
+                        print("WARNING: No clutter map at %s! Finding clutter from this volume instead." % c.clutter_map_settings['path'])
+                # Gates the map cannot decide yet (new map, new tilt) are classified from this volume
+                clutter_mask, decided = clutter_map.get_mask(site_map, radar, c.clutter_map_settings['min_fraction'])
+            radar = quality_control.removeMountainClutter(radar,fields,clutter_mask,decided)
         
-        #pytda.calc_turb_sweep(radar) #someday!!
+        # Derived fields (snow rate, vdiv, Kdp, EDR) are attached here but only calculated when they are plotted
+        for name in derived_fields.attach(radar, c.derived, c.derived_options):
+            fields.append(name)
+            vrange, cmap, colorbar_label = derived_fields.plot_settings(name)
+            ranges.append(vrange)
+            cmaps.append(cmap)
+            colorbar_labels.append(colorbar_label)
         
         # Set figure sizes
-        if scan_strat == 'RHI':
+        if c.scan_strat == 'RHI':
             #for 0 to 6 km use [40,6]
             #for 0 to 9 km use [42,8]
             figsize = [38,8]#[40,6] #some others that have been useful [40,12]#[14.66, 3.652]#[40, 12]#[49.82, 4]#[43.6, 3.5]#30,4 #25,4
@@ -138,8 +152,8 @@ def parse_filelist(filelist, inpath, outpath, radar_type, fields, ranges, plot_b
             figsize = [16,16] #Same settings used for PPI and sector scans # [16.346, 12]
         
         # Create and save plots
-        if plot_bool == True:
-                Master_plotter.plot(radar, radar_type, filename, outpath, scan_strat, fields, ranges, cmaps, colorbar_labels, figsize, dealias_bool, x_lim, y_lim, contour_bool, base_field, contour_field, contour_levels, azi_overlay)
+        if c.plot_bool == True:
+                Master_plotter.plot(radar, c.radar_type, filename, c.outpath, c.scan_strat, fields, ranges, cmaps, colorbar_labels, figsize, c.dealias_bool, c.x_lim, c.y_lim, c.contour_bool, c.base_field, c.contour_field, c.contour_levels, c.azi_overlay)
         else: 
             #Do nothing, other than collect the garbage
             gc.collect()
@@ -7,11 +7,12 @@ DESCRIPTION: Use this script to easily process and plot radar data in PyART.
 MANUAL VARIABLES (These must be changed by hand):
     inpath: File path containing the radar data to be processed.
     outpath: File path where images and/or processed data should be saved
-    wildcard: String found in all of the data files. Used to automatically determine the radar type.
+    wildcard: String found in all of the data files. Used to select the files to process.
     scan_strat: String describing the scan strategy ('PPI', 'RHI', or 'Sector').
     
     snow_rate_bool: True/False on whether to calculate the Rasmussen snow rate (rescaled reflectivity).
-    vdiv_bool: True/False on whether to calculate the vertical divergence of horizontal velocity (RHI only)
+    vdiv_bool: True/False on whether to calculate the vertical divergence (shear) of horizontal velocity
+    edr_settings: Dictionary containing settings for the eddy dissipation rate retrieval (used when edr_bool is on for the radar).
     
     contour_bool: True/False whether to overlay contours of a secondary field over a plot of a base field.
     base_field: Field to be plotted normally.
@@ -20,26 +21,40 @@ MANUAL VARIABLES (These must be changed by hand):
     
     azi_overlay: Dictionary containing settings for drawing RHI azimuths on a PPI plot.
     
+    clutter_map_settings: Dictionary containing settings for the site's static clutter map (see clutter_map).
+    
+    pool_settings: Dictionary containing settings for the pool of worker processes (number of workers and how often they are replaced).
+    watch_mode: Dictionary containing settings for real-time mode. When enabled, the script keeps running and processes new files as they arrive in inpath.
+    
     dealias_bool: True/False on whether to dealias velocity data or leave folded.
     save_cfradial_bool: True/False on whether to save a CF/Radial data files containing dealiased velocity data.
+    volume_cache_bool: True/False on whether to cache processed volumes in outpath. Later runs load the cache and skip reading, QC, and dealiasing.
+    raw_cache: Dictionary containing settings for the on-disk cache of decoded raw files. Repeated runs on the same files skip decoding.
     
 SEMIAUTOMATIC VARIABLES (Take care of themselves for KASPR, CHILL, and NEXRAD, but can be controlled manually):
-    radar_type: Used throughout the toolkit to discriminate between the different radars.
+    radar_type: None to recognize the radar of each file from the file itself, or the name of a radar profile to use for every file.
+    profile_overrides: Dictionary of settings that replace the defaults of a radar profile for this run.
+    plot_bool: True/False on whether or not to make plots. Leave at True unless only using PyART to save off data.
+    temporal_dealias_settings: Dictionary containing settings for checking dealiased velocity against the previous volume. Disabled by default.
+    rhoHV_mask: Dictionary containing settings for rhoHV filter. Enabled and set to retain data between 0.45 and 1.2 by default.
+    NCP_mask: Dictionary containing settings for NCP filter. Disabled by default.
+    SNR_mask: Dictionary containing settings for SNR filter. Disabled by default.
+    despeckle_settings: Dictionary containing settings for the despeckle filter. Disabled by default; when enabled, gates in velocity patches smaller than min_size gates are removed from every QC'd field.
+
+RADAR PROFILE VARIABLES (Set for each radar in radar_profiles.py, can be changed for a run with profile_overrides):
     fields: Data types observed.
     ranges: Ranges corresponding to the fields.
-    plot_bool: True/False on whether or not to make plots. Leave at True unless only using PyART to save off data.
+    cmaps: Colormaps to use when plotting the fields.
+    colorbar_labels: Labels for the colorbars corresponding to the fields and ranges.
     x_lim: x-limit for image output.
     y_lim: y-limit for image output.
-    colorbar_labels: Labels for the colorbars corresponding to the fields and ranges.
     name2dealias: Name of the folded velocity field.
     new_name: String that PyART will name the dealiased velocity field.
-    nyquist_vel: Nyquist velocity used by dealiaser. MUST BE SET MANUALLY FOR NEXRAD.
-    cmaps: Colormaps to use when plotting the fields.
-    rhoHV_mask: Dictionary containing settings for rhoHV filter. Enabled and set to retain data between 0.45 and 1.2 by default.
-    NCP_mask: Dictionary containing settings for NCP filter. Disabled by default.
-    SNR_mask: Dictionary containing settings for SNR filter. Disabled by default.
+    nyquist_vel: Fallback Nyquist velocity for the dealiaser. Each sweep is dealiased with the Nyquist velocity recorded in the file when there is one. May be set per wildcard (e.g. CHL and CHX), chosen from each file's name.
     Zdr_offset: Dictionary containing settings for accounting for Zdr offset on some radars. Disabled for CHILL and NEXRAD. Enabled and accounts for 1.2 dB offset on KASPR.
     mountain_clutter_bool: True/False to run/not run the mountain removal code. MUST BE SET MANUALLY FOR NEXRAD.
+    kdp_bool: True/False on whether to estimate Kdp from PhiDP (on by default for NEXRAD and CHILL)
+    edr_bool: True/False on whether to retrieve the eddy dissipation rate from spectrum width (on by default for KASPR and CHILL)
     
     
     
@@ -55,13 +70,14 @@ Undergraduate Research Assistant at Environment Analytics
 
 """
 # Load necessary packages (set appropriate working directory!)
-import colormap
-import gen_fun
-import run_fun
+import file_index
+import radar_profiles
+import run_config
+import watcher
+import worker_pool
 import gc
 import time
 import numpy as np
-from multiprocessing import Process
 
 ######### Define Variables #############
 ### Path Variables
@@ -69,7 +85,7 @@ inpath = 'C:\\Users\\mpete19\\Documents\\kaspr\\data\\20191201\\PPI\\'
 outpath = 'C:\\Users\\mpete19\\Documents\\kaspr\\images\\20191201\\PPI\\'
 
 ### File and Data Variables ###
-wildcard = 'KASPR' #Common wildcards are below
+wildcard = 'KASPR' #Common wildcards are below. Use '' to process every file in inpath, e.g. for a run that mixes radars
 #CHL: CSU-CHILL S-band
 #CHX: CSU-CHILL X-band
 #KASPR: SBU Ka-band
@@ -84,103 +100,38 @@ scan_strat = 'PPI' #Possible entries are below
 #Sector: Plan view at a specific tilt angle, with a confined set of azimuths. ONLY PARTIALLY IMPLEMENTED
 # PyART can be used with other scan strategies but these are not yet supported in this toolkit.
 
-# Determine radar type
-if wildcard == 'CHX':
-    radar_type = 'CHILL'
-elif wildcard == 'CHL':
-    radar_type = 'CHILL'
-elif wildcard == 'KASPR':
-    radar_type = 'KASPR'
-else:
-    if len(wildcard)==4:
-        radar_type = 'NEXRAD'
-    else:
-        print("WARNING: Unknown radar type! Processing with NEXRAD settings to give best chance of success.")
-        radar_type = 'NEXRAD'
-    
-# List of strings (field names)
-#HF-S: ['DBZH','DBZV','ZDR','RHOHV','PHIDP','SNRHC','SNRVC','dealiasVELH']
-#KASPR: ['correlation_coefficient','differential_phase','differential_reflectivity','linear_depolarization_ratio','linear_depolarization_ratio_hc_hh','mean_doppler_velocity','mean_doppler_velocity_folded','reflectivity','reflectivity_xpol_htx','reflectivity_xpol_vtx','snr','snr_xpol_htx','snr_xpol_vtx','spectrum_width']
-#StormRanger:
-#
-#fields: strings, refer to the data types observed
-#ranges: numerical tuples, the ranges corresponding to the fields. ORDER OF THE RANGES MUST MATCH ORDER OF FIELDS
-if radar_type=='CHILL':
-    fields = ['reflectivity','dealiased_velocity','corrected_differential_reflectivity','spectrum_width','cross_correlation_ratio','normalized_coherent_power','one_way_differential_phase','two_way_differential_phase']
-    ranges = [(-5,25),(-20,20),(-1,2),(0,4),(0.4,1),(0,1),(-60,-120),(-1.5,1.5)] #CSU-CHILL (winter) X-band
-elif radar_type=='KASPR':
-    fields = ['correlation_coefficient','differential_reflectivity','PyART_dealiased_velocity','reflectivity','spectrum_width','linear_depolarization_ratio','snr']
-    ranges = [(0.5,1),(-2,2),(-45,45),(-20,30),(0,3),(-40,-20),(0,100)] #KASPR (commonly-used) (winter)
-elif radar_type=='NEXRAD':
-    fields = ['correlation_coefficient','differential_reflectivity','PyART_dealiased_velocity','reflectivity','spectrum_width','linear_depolarization_ratio','snr','kdp','differential_phase']
-    ranges = [(0.5,1),(-2,2),(-45,45),(-5,40),(0,3),(-40,-20),(20,100),(-3,3),(-180,180)] #KASPR (commonly-used) (winter)
-# Other common ranges
-#ranges = [(-5,25),(-40,40),(-1,2),(0,8),(0.4,1),(0,1),(-30,-60),(-0.5,0.5)] #CSU-CHILL (winter) S-band
-#ranges = [(-5,65),(-40,40),(-3,5),(0,8),(0.5,1),(0,1),(-5,5)] #CSU-CHILL (summer)
-#ranges = #StormRanger
-#ranges = [(0,60),(0,60),(-20,0),(0,1),(0,180),(0,1),(0,1),(-40,40)] #HF-S, with broken Zdr
+# Radar type. The fields, ranges, colormaps, plot limits, dealiasing names, and default QC settings of each radar are
+# set in its profile in radar_profiles.py. None recognizes the radar of each file from the file itself, so one run can
+# mix radars (set wildcard = '' so the files of every radar are selected). Set to a profile name (e.g. 'KASPR') to
+# process every file with that profile.
+radar_type = None
+
+# Settings that replace a profile's defaults for this run, e.g. {'KASPR': {'x_lim': [-20,20], 'y_lim': [-20,20]}}
+profile_overrides = {}
 
 ### Plotting Variables ###
 plot_bool = True #Determines whether to make plots or not
 
-# Set x and y limits for radar plot
-if scan_strat != 'RHI':
-    x_lim = [-60,60]
-    y_lim = [-60,60]
-    if radar_type == 'NEXRAD':
-        x_lim = [-175,175]
-        y_lim = [-175,175]
-    elif radar_type == 'KASPR':
-        x_lim = [-30,30]
-        y_lim = [-30,30]
-if scan_strat == 'RHI':
-    x_lim = [-30,30]
-    y_lim = [0,12]
-
-# Other useful x-limits
-#x_lim = [-375,375] #HF-S PPI
-#x_lim =  #StormRanger
-#x_lim = [0,75] #CSU-CHILL X-band max RHI range
-# Other useful y-limits
-#y_lim = [-375,375] #HF-S PPI
-#y_lim = #StormRanger
-#y_lim = [0,16] #CSU-CHILL RHI (summer)
-
-# List of strings (colorbar labels)
-#colorbar_labels = ['DBZ (dBZ)','DBZ (dBZ)','ZDR (DB)','rhoHV','PhiDP','SNR','SNR','V (m/s)'] #HF-S
-#colorbar_labels = #StormRanger
-#colorbar_labels = ['rhoHV','PhiDP','ZDR (DB)','V (m/s)','DBZ (dBZ)','Width (m/s)'] #KASPR few
-if radar_type=='CHILL':
-    colorbar_labels = ['DBZ (dBZ)','V (m/s)','ZDR (dB)','Width (m/s)','rhoHV','NCP','PhiDP (deg)','KDP (deg/km)'] #CSU-CHILL
-elif radar_type=='KASPR':
-    colorbar_labels = ['rhoHV','Zdr (dB)','V (m/s)','Z (dBZ)','Spectral Width (m/s)','LDR (dB)','SNR','Kdp (deg/km)','PhiDP (deg)'] #KASPR common
-elif radar_type=='NEXRAD':
-    colorbar_labels = ['DBZ (dBZ)','V (m/s)','Width (m/s)','rhoHV','Zdr (dB)']
-
 ### Dealiasing Variables ###
 dealias_bool = True
 save_cfradial_bool = False #Save the radar data with dealiased velocity in a CF/Radial file
+volume_cache_bool = False #Cache processed volumes; each combination of QC and dealiasing settings gets its own .volcache files
+
+#   Temporal dealiasing
+# Checks each dealiased volume against the previous volume from the same radar and tilt, fixing regions unfolded
+# into the wrong Nyquist interval. Files must be processed in time order; each worker keeps its own previous volume.
+temporal_dealias_settings = {
+        "bool": False,
+        "max_age": 900 #Seconds; older previous volumes are not used
+        }
 
-if radar_type=='CHILL':
-    name2dealias = 'corrected_velocity' #CSU-CHILL
-    new_name = 'dealiased_velocity'
-    if wildcard=='CHL':
-        nyquist_vel = 27.5039 #S-band CHILL
-    elif wildcard=='CHX':
-        nyquist_vel = 25.893 #X-band CHILL
-elif radar_type=='KASPR':
-    name2dealias = 'mean_doppler_velocity_folded' #KASPR
-    new_name = 'PyART_dealiased_velocity' #KASPR
-    nyquist_vel= 9.999 #KASPR
-elif radar_type=='NEXRAD':
-    name2dealias = 'velocity'
-    new_name = 'dealiased_velocity'
-    nyquist_vel = 26.389 #KCYS 2018 02 01, this can vary and will need to be detected automatically
-#name2dealias = 'VELH' #HF-S
-#new_name = 'dealiasVELH' #HF-S
-#nyquist_vel = 8.5048 #HF-S
-#name2dealias = #StormRanger
-#new_name = #StormRanger
+### Decoded file cache ###
+# Raw files are decoded once and cached by file contents (bounded in size, least recently used files are removed first).
+raw_cache = {
+        "bool": False,
+        "path": 'C:\\Users\\mpete19\\Documents\\kaspr\\raw_cache\\',
+        "max_gb": 20
+        }
 
 #######################################
 
@@ -191,36 +142,6 @@ outpath = outpath + '\\'
 print(inpath)
 print(outpath)
 
-# Load color maps
-# L_range is the luminance range. If the colors come out too dark then raise the minimum luminance value.
-max_luminance = 100
-min_luminance = 0
-LCH = colormap.LCH_Spiral()[0]
-LCH_zdr = colormap.LCH_Spiral(nc = 100, np = .3, offset = 0, reverse = 1, L_range = [max_luminance, min_luminance], name = 'LCH_zdr')[0]
-LCH_wid = colormap.LCH_Spiral(nc = 100, np = .3, offset = 45, reverse = 0, L_range = [max_luminance, min_luminance], name = 'LCH_wid')[0]
-Int = colormap.PID_Integer()
-IntCHILL = colormap.PID_Integer_CHILL()
-cuckooPalette = colormap.cuckoo()
-
-# Set colormaps
-#CAUTION: DO NOT USE 'seismic' FOR VELOCITY DATA. 'seismic' is asymmetric around its zero value, which skews the apparent magnitude
-#of negative values relative to positive values. 'RdBu_r' is preferred.
-#cmaps = [LCH,LCH,LCH_zdr,'bone_r','cividis','copper','copper','RdBu_r'] #HF-S
-#cmaps = #StormRanger
-if radar_type=='CHILL':
-    cmaps = [LCH,'RdBu_r',LCH_zdr,LCH_wid,'bone_r','copper','magma',cuckooPalette] #CSU-CHILL
-elif radar_type=='KASPR':
-    cmaps = ['bone_r',LCH_zdr,'RdBu_r',LCH,LCH_wid,'inferno','copper',cuckooPalette,'magma'] #KASPR common
-elif radar_type=='NEXRAD':
-    cmaps = [LCH,'RdBu_r',LCH_wid,'bone_r',LCH_zdr]
-
-# Make filelist
-filelist = gen_fun.get_filelist(inpath, wildcard, False)
-
-# Plausibility check on inputs
-if len(cmaps)!=len(colorbar_labels):
-    raise IndexError('Check number of colormaps and colorbars!')
-
 
 # Data quality
 #   Remove values outside of a given range for some variable.
@@ -256,32 +177,29 @@ SNR_mask = {
         "range": (0, 100) #(0,100) to remove only NaNs
         }
 
-#   Account for Zdr offset on radars such as KASPR or HF-S
-if radar_type=='CHILL':
-    Zdr_offset = {
-            "bool": False,
-            "offset": 0.0
-            }
-elif radar_type=='KASPR':
-    Zdr_offset = {
-            "bool": True,
-            "offset": 1.2}
-else:
-    Zdr_offset = {
-            "bool": False,
-            "offset": 0.0}
-       
+#   Despeckle settings. Removes isolated patches of velocity (and the same gates in all other fields) before dealiasing
+despeckle_settings = {
+        "bool": False, #Off by default, since it changes every QC'd field (reflectivity included)
+        "min_size": 10 #Patches with fewer gates than this are removed
+        }
+
 #   Logicals for derived data
 snow_rate_bool = True #Derive the Rasmussen snow rate from reflectivity
-vdiv_bool = True #Calculate the vertical divergence of horizontal dealiased velocity (RHI only)
+vdiv_bool = True #Calculate the vertical divergence (shear) of horizontal dealiased velocity
+#Kdp from PhiDP (kdp_bool) and turbulence from spectrum width (edr_bool) are set per radar in radar_profiles.py
+edr_settings = {
+        "threads": 4 #Sweeps processed at once in each worker. Keep workers (pool_settings) x threads at or below the CPU count
+        }
 
-#   Other logicals
-if radar_type=='CHILL':
-    mountain_clutter_bool = True #Remove mountain clutter from CHILL data automatically
-elif radar_type=='KASPR':
-    mountain_clutter_bool = False #No mountains in New York City!
-elif radar_type=='NEXRAD':
-    mountain_clutter_bool = True #Needs to be set manually
+#   Static clutter map settings (used with mountain_clutter_bool)
+# Counts how often each azimuth/gate/tilt is clutter over many volumes and removes the cells that are clutter most of the time.
+# To build or extend a map from files that are already processed, run clutter_map.update_from_files(path, filelist, inpath).
+clutter_map_settings = {
+        "bool": False, #Remove clutter using the site's clutter map. Gates the map has seen too few times are classified from the volume
+        "path": outpath+"clutter_map.bin",
+        "update": False, #Add each processed volume to the map. Workers take turns through a lock file
+        "min_fraction": 0.5 #Fraction of volumes in which a cell must be clutter to be removed
+        }
 
 #   Contour overlay settings
 contour_bool = False
@@ -295,7 +213,9 @@ if scan_strat == 'PPI':
             "bool": False,
             "azi_lines": [134,224],
             "color": "#105456",
-            "linewidth": 4.2
+            "linewidth": 4.2,
+            "range_rings": None, #Range ring spacing in km, None for no rings
+            "grid": None #Grid line spacing in km, None for no grid lines
             }
 elif scan_strat == 'RHI':
     azi_overlay = {
@@ -306,30 +226,68 @@ elif scan_strat == 'RHI':
         }
         
 
-#   Parse through filelist
-# Processing is conducted within individual processes that are started and ended with each file.
-# Otherwise, Python's memory use will grow until the computer's memory is expended,
-# crashing the system. This is not a memory leak in PyART! It's just a consequence of how Python's memory handling
-# deals with long-running processes.
+#   Worker settings
+# Files are processed by a pool of long-lived workers that import PyART, matplotlib, etc. only once. Python's memory use
+# grows in long-running processes (this is not a memory leak in PyART! It's just a consequence of how Python's memory
+# handling deals with long-running processes), so each worker is replaced after files_per_worker files.
+pool_settings = {
+        "workers": 1, #Number of files processed at once
+        "files_per_worker": 25 #Files a worker processes before it is replaced; None to never replace
+        }
+
+#   Real-time mode
+# Instead of processing the files already in inpath and exiting, keep running and process each new file as soon as
+# it has finished arriving.
+watch_mode = {
+        "bool": False,
+        "poll_interval": 2, #Seconds between checks of inpath
+        "settle_time": 5, #Seconds a file must stop changing before it is processed
+        "process_existing": False #Also process files already in inpath when watching starts
+        }
+
+# Settings shared by every radar. The rest come from the radar profiles.
+common_settings = dict(inpath=inpath, outpath=outpath, plot_bool=plot_bool, scan_strat=scan_strat,
+            dealias_bool=dealias_bool, save_cfradial_bool=save_cfradial_bool, volume_cache_bool=volume_cache_bool,
+            raw_cache=raw_cache, temporal_dealias_settings=temporal_dealias_settings, Z_mask=Z_mask, Zdr_mask=Zdr_mask,
+            PhiDP_mask=PhiDP_mask, rhoHV_mask=rhoHV_mask, NCP_mask=NCP_mask, SNR_mask=SNR_mask,
+            despeckle_settings=despeckle_settings, snow_rate_bool=snow_rate_bool, vdiv_bool=vdiv_bool,
+            edr_settings=edr_settings,
+            clutter_map_settings=clutter_map_settings, contour_bool=contour_bool, base_field=base_field,
+            contour_field=contour_field, contour_levels=contour_levels, azi_overlay=azi_overlay)
+
+# One configuration per radar profile, checked and frozen once. Workers receive them all when they start.
+profile_names = [radar_type] if radar_type else list(radar_profiles.PROFILES)
+configs = dict((name, run_config.make_config(**dict(common_settings, **radar_profiles.run_settings(
+            name, scan_strat, profile_overrides.get(name))))) for name in profile_names)
 
+#   Parse through filelist
 if __name__== '__main__':
+    pool = worker_pool.make_pool(pool_settings['workers'], pool_settings['files_per_worker'], configs)
+    if watch_mode['bool']:
+        print("Watching %s for new files! Press Ctrl+C to stop." % inpath)
+        try:
+            for new_file in watcher.watch(inpath, wildcard, watch_mode['poll_interval'], watch_mode['settle_time'],
+                                          watch_mode['process_existing']):
+                print("New file: %s" % new_file)
+                pool.apply_async(worker_pool.run_job, args=((new_file, radar_type or radar_profiles.detect(inpath + new_file)),))
+        except KeyboardInterrupt:
+            print("Stopping, waiting for files in progress to finish.")
+    else:
+        # Make filelist from the directory's file index. Only the radars of the selected files are
+        # recognized, and each file is opened for that once across runs. Inside __main__ so worker
+        # processes do not rescan the directory when they start.
+        index = file_index.scan(inpath)
+        filelist = file_index.query(index, wildcard, detect=not radar_type)
         length_filelist = np.size(filelist)
         print("Processing in progress!")
-        for item in range(0,length_filelist):
-            filelist_ind=filelist[item]
-            # Instantiate a new process.
-            p = Process(target=run_fun.parse_filelist,args=(filelist_ind, inpath, outpath, radar_type, fields, ranges, plot_bool, 
-                                                                cmaps, colorbar_labels, x_lim, y_lim, scan_strat, 
-                                                                dealias_bool, save_cfradial_bool, name2dealias, new_name, nyquist_vel, Z_mask, Zdr_mask, PhiDP_mask,
-                                                                rhoHV_mask, NCP_mask, SNR_mask, Zdr_offset, snow_rate_bool, vdiv_bool, mountain_clutter_bool,
-                                                                contour_bool, base_field, contour_field, contour_levels, azi_overlay))
-            p.start()
-            #print(p.is_alive())
-            p.join()
-            p.terminate() #End the process
+        # Each file is processed with the profile of the radar it came from
+        jobs = [(filename, radar_type or index['files'][filename][2] or radar_profiles.detect(inpath + filename))
+                for filename in filelist]
+        for item, done in enumerate(pool.imap(worker_pool.run_job, jobs)):
             numleft = (length_filelist - item -1)
             print(numleft) #Displays how many files remain to be processed in current job
-            
-        print("Completed!")
+    pool.close()
+    pool.join()
+    print("Completed!")
 
 gc.collect()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Uses the previous volume as a reference for dealiasing. Successive KASPR and NEXRAD volumes
+are only minutes apart, so the dealiased velocity of the last volume is a good first guess for the
+next one. After the region-based dealiaser has run, each connected echo region of a sweep is shifted by
+the whole number of Nyquist intervals (2*Nyquist velocity) that brings it closest to the reference. This
+fixes regions that the dealiaser unfolded into the wrong interval, the most common dealiasing error. The
+corrected sweep then becomes the reference for the next volume.
+Contains:
+    correct
+    clear
+
+References are stored at low resolution (1 degree by 4 gates) and only the latest one is kept for each
+radar and tilt, so memory use stays small however long the run. References live in the process that
+made them; with several workers each worker keeps its own.
+
+Version date: 10/19/2026
+"""
+
+import numpy as np
+import scipy.ndimage as spyi
+import pyart
+
+ANGLE_BINS = 360 #Reference resolution in azimuth (elevation for RHIs)
+GATE_BLOCK = 4 #Gates averaged together in the reference
+_REFERENCES = {} #(instrument, tilt): reference dictionary, see _make_reference
+
+def correct(radar, field, sweep_nyquist, max_age=900):
+    """
+    DESCRIPTION: Corrects the dealiased velocity of each sweep against the reference from the previous
+        volume, then stores the corrected sweeps as the new references.
+
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    field = Name of the dealiased velocity field. Corrected in place.
+    sweep_nyquist = Array of Nyquist velocities, one per sweep (see quality_control.get_sweep_nyquist).
+        If None, nothing is corrected, but references are still stored.
+
+    OPTIONAL INPUTS:
+    max_age = Default set to 900. References older than this many seconds are not used.
+
+    OUTPUTS:
+    radar = The original radar object with the corrected field.
+    """
+    volume_time = pyart.util.datetime_from_radar(radar)
+    velocity = radar.fields[field]['data']
+    valid = ~np.ma.getmaskarray(velocity) & np.isfinite(np.ma.getdata(velocity))
+    data = np.ma.getdata(velocity)
+
+    for sweep_num in range(radar.nsweeps):
+        sweep = radar.get_slice(sweep_num)
+        key = _key(radar, sweep_num)
+        reference = _REFERENCES.get(key)
+        if (reference is not None and sweep_nyquist is not None
+                and abs((volume_time - reference['time']).total_seconds()) <= max_age):
+            ref = _sample_reference(reference, radar, sweep)
+            sweep_data = data[sweep]
+            interval = 2*sweep_nyquist[sweep_num]
+            labels, nlabels = spyi.label(valid[sweep])
+            usable = (labels > 0) & np.isfinite(ref)
+            if nlabels > 0 and usable.any():
+                # Median number of Nyquist intervals between each region and the reference
+                folds = np.asarray(spyi.median(np.where(usable, (sweep_data - ref)/interval, 0),
+                                               np.where(usable, labels, 0), np.arange(1, nlabels + 1)))
+                folds = np.round(np.nan_to_num(folds))
+                shift = np.concatenate([[0.], folds])[labels]*interval
+                sweep_data -= shift.astype(sweep_data.dtype)
+        _REFERENCES[key] = _make_reference(radar, sweep, data, valid, volume_time)
+    return radar
+
+def clear():
+    """
+    DESCRIPTION: Forgets all references, e.g. before processing a different case.
+    """
+    _REFERENCES.clear()
+
+def _key(radar, sweep_num):
+    """
+    DESCRIPTION: Reference key of a sweep: the radar name and the sweep's fixed angle.
+    """
+    return (radar.metadata.get('instrument_name'), radar.scan_type,
+            round(float(radar.fixed_angle['data'][sweep_num]), 1))
+
+def _angles(radar, sweep):
+    """
+    DESCRIPTION: Angle of each ray used for the reference bins: azimuth, or elevation for RHIs.
+    """
+    if radar.scan_type == 'rhi':
+        return np.mod(radar.elevation['data'][sweep], 180.)*ANGLE_BINS/180.
+    return np.mod(radar.azimuth['data'][sweep], 360.)*ANGLE_BINS/360.
+
+def _make_reference(radar, sweep, data, valid, volume_time):
+    """
+    DESCRIPTION: Averages a dealiased sweep into reference bins (ANGLE_BINS x gates/GATE_BLOCK).
+    """
+    ngates = radar.ngates
+    nblocks = -(-ngates // GATE_BLOCK)
+    angle_bin = np.clip(_angles(radar, sweep).astype(np.intp), 0, ANGLE_BINS - 1)
+    cell = (angle_bin[:, np.newaxis]*nblocks + (np.arange(ngates)//GATE_BLOCK)[np.newaxis, :]).ravel()
+    weights = valid[sweep].ravel()
+    total = np.bincount(cell, weights=np.where(weights, data[sweep].ravel(), 0), minlength=ANGLE_BINS*nblocks)
+    count = np.bincount(cell, weights=weights, minlength=ANGLE_BINS*nblocks)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = (total/count).astype(np.float32).reshape(ANGLE_BINS, nblocks)
+    return {'time': volume_time, 'velocity': mean,
+            'first_gate': float(radar.range['data'][0]),
+            'block_spacing': float(np.median(np.diff(radar.range['data'])))*GATE_BLOCK}
+
+def _sample_reference(reference, radar, sweep):
+    """
+    DESCRIPTION: Reference velocity at every ray and gate of a sweep (NaN where there is none).
+    """
+    angle_bin = np.clip(_angles(radar, sweep).astype(np.intp), 0, ANGLE_BINS - 1)
+    block = np.floor((radar.range['data'] - reference['first_gate'])/reference['block_spacing'] + 1e-6).astype(np.intp)
+    nblocks = reference['velocity'].shape[1]
+    inside = (block >= 0) & (block < nblocks)
+    ref = reference['velocity'][angle_bin[:, np.newaxis], np.clip(block, 0, nblocks - 1)[np.newaxis, :]]
+    ref[:, ~inside] = np.nan
+    return ref
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Compact binary cache for processed radar volumes. A volume is written once quality
+control and dealiasing are complete, and later runs memory-map it instead of reading and
+dealiasing the raw file again. Useful when only colormaps, ranges, or plot limits change.
+Contains:
+    get_cachename
+    write_volume
+    read_volume
+
+FILE LAYOUT:
+    8-byte magic string, 8-byte little-endian header length, JSON header, then one raw block per
+    array, each starting on a 64-byte boundary. Fields are stored as contiguous float32 (or int16
+    with a scale and offset) with the QC mask packed to one bit per gate. Everything else in the
+    radar object (time, range, sweep information, metadata...) lives in the header.
+
+Version date: 10/19/2026
+"""
+
+import json
+import os
+import struct
+import numpy as np
+import pyart
+
+MAGIC = b'PYARTVC1'
+ALIGNMENT = 64
+INT16_FILL = np.iinfo(np.int16).min
+
+# Radar attributes stored alongside the fields. All are keyword arguments of pyart.core.Radar,
+# except 'range' which is passed as '_range'.
+RADAR_ATTRS = ['time', 'range', 'metadata', 'latitude', 'longitude', 'altitude', 'altitude_agl',
+               'sweep_number', 'sweep_mode', 'fixed_angle', 'sweep_start_ray_index',
+               'sweep_end_ray_index', 'target_scan_rate', 'rays_are_indexed', 'ray_angle_res',
+               'azimuth', 'elevation', 'scan_rate', 'antenna_transition', 'instrument_parameters',
+               'radar_calibration', 'rotation', 'tilt', 'roll', 'drift', 'heading', 'pitch',
+               'georefs_applied']
+
+def get_cachename(outpath, filename, key=None):
+    """
+    DESCRIPTION: Constructs the name of the cache file for a given radar file.
+
+    INPUTS:
+    outpath = A string that specifies the full path to where the cache file will be saved.
+    filename = A string containing the name of the raw radar file.
+
+    OPTIONAL INPUTS:
+    key = Default set to None. Short string naming the settings the volume was processed with
+        (e.g. run_config.RunConfig.processing_key). Volumes processed with different settings get
+        different cache files.
+
+    OUTPUTS:
+    cachename = A string containing the full path of the cache file.
+    """
+    if key is None:
+        cachename = "%s%s.volcache" % (outpath, filename)
+    else:
+        cachename = "%s%s.%s.volcache" % (outpath, filename, key)
+    return cachename
+
+def write_volume(radar, cachename, int16_fields=()):
+    """
+    DESCRIPTION: Saves a processed radar object to a compact cache file.
+
+    INPUTS:
+    radar = A python object structure that contains radar information. Created
+        by PyART in one of the pyart.io.read functions.
+    cachename = A string containing the full path of the cache file. See get_cachename.
+
+    OPTIONAL INPUTS:
+    int16_fields = Names of fields to store as scaled int16 instead of float32. Halves the size
+        of the field at the cost of quantizing it to 65535 levels between its min and max.
+
+    OUTPUTS:
+    The saved cache file. The file is written under a temporary name and moved into place, so
+    other processes never see a partial cache.
+    """
+    blocks = []
+    header = {'version': 1, 'scan_type': radar.scan_type, 'attrs': {}, 'fields': {}}
+    for attr in RADAR_ATTRS:
+        header['attrs'][attr] = split_arrays(getattr(radar, attr), blocks)
+    for field_name, dic in radar.fields.items():
+        encoding = 'int16' if field_name in int16_fields else 'float32'
+        header['fields'][field_name] = _encode_field(dic, encoding, blocks)
+    write_container(cachename, header, blocks)
+
+def read_volume(cachename, mmap=True):
+    """
+    DESCRIPTION: Loads a radar object from a cache file written by write_volume.
+
+    INPUTS:
+    cachename = A string containing the full path of the cache file.
+
+    OPTIONAL INPUTS:
+    mmap = Default set to True. Memory-maps float32 fields (copy-on-write) instead of reading
+        them into memory, so loading is nearly free and only the gates that are used get read.
+
+    OUTPUTS:
+    radar = A python object structure that contains radar information, identical in layout to
+        one created by PyART in one of the pyart.io.read functions.
+    """
+    header, blocks = read_container(cachename, mmap)
+    attrs = dict((attr, join_arrays(value, blocks)) for attr, value in header['attrs'].items())
+    fields = dict((field_name, _decode_field(value, blocks))
+                  for field_name, value in header['fields'].items())
+    radar = pyart.core.Radar(_range=attrs.pop('range'), fields=fields,
+                             scan_type=header['scan_type'], **attrs)
+    return radar
+
+def _encode_field(dic, encoding, blocks):
+    """
+    DESCRIPTION: Converts a radar field dictionary to its cache header entry, appending the field
+    values and the packed mask to blocks. Gates that are masked or not finite (QC functions set
+    removed gates to NaN) are both recorded in the mask.
+    """
+    data = np.ma.masked_invalid(dic['data'], copy=False)
+    mask = np.ma.getmaskarray(data)
+    entry = {'attrs': split_arrays(dict((k, v) for k, v in dic.items() if k != 'data'), blocks),
+             'encoding': encoding, 'shape': list(mask.shape)}
+
+    if encoding == 'int16':
+        if mask.all():
+            val_min, val_max = 0.0, 1.0
+        else:
+            val_min, val_max = float(data.min()), float(data.max())
+        if val_max == val_min:
+            val_max = val_min + 1
+        # int16 minimum is reserved for masked gates
+        scale = (val_max - val_min) / (np.iinfo(np.int16).max - INT16_FILL - 1)
+        offset = val_min - (INT16_FILL + 1) * scale
+        values = np.round((data.filled(val_min) - offset) / scale).astype(np.int16)
+        values[mask] = INT16_FILL
+        entry['scale'] = scale
+        entry['offset'] = offset
+    else:
+        values = np.asarray(np.ma.getdata(data), dtype=np.float32)
+
+    blocks.append(values)
+    entry['data'] = len(blocks) - 1
+    blocks.append(np.packbits(mask, axis=None))
+    entry['mask'] = len(blocks) - 1
+    return entry
+
+def _decode_field(entry, blocks):
+    """
+    DESCRIPTION: Rebuilds a radar field dictionary from its cache header entry.
+    """
+    shape = tuple(entry['shape'])
+    values = blocks[entry['data']]
+    if entry['encoding'] == 'int16':
+        values = values.astype(np.float32) * np.float32(entry['scale']) + np.float32(entry['offset'])
+    mask = np.unpackbits(blocks[entry['mask']])[:int(np.prod(shape))].reshape(shape).view(bool)
+
+    dic = join_arrays(entry['attrs'], blocks)
+    dic['data'] = np.ma.MaskedArray(values, mask=mask, copy=False)
+    return dic
+
+def split_arrays(obj, blocks):
+    """
+    DESCRIPTION: Replaces every array in a nested structure of dicts and lists with a reference to
+    a raw block, leaving a structure that can be written to the JSON header.
+
+    INPUTS:
+    obj = The object to split. Usually a radar attribute dictionary.
+    blocks = List of arrays. Arrays found in obj are appended to it.
+
+    OUTPUTS:
+    skeleton = obj with arrays replaced by {'__block__': index} (or {'__masked__': index,
+        '__mask__': index} for masked arrays).
+    """
+    if isinstance(obj, np.ma.MaskedArray):
+        blocks.append(np.ma.getdata(obj))
+        skeleton = {'__masked__': len(blocks) - 1}
+        blocks.append(np.ma.getmaskarray(obj))
+        skeleton['__mask__'] = len(blocks) - 1
+        return skeleton
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.hasobject:
+            return split_arrays(obj.tolist(), blocks)
+        blocks.append(obj)
+        return {'__block__': len(blocks) - 1}
+    if isinstance(obj, dict):
+        return dict((key, split_arrays(value, blocks)) for key, value in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return [split_arrays(value, blocks) for value in obj]
+    return obj
+
+def join_arrays(skeleton, blocks):
+    """
+    DESCRIPTION: Inverse of split_arrays, puts the raw blocks back in place of their references.
+    """
+    if isinstance(skeleton, dict):
+        if '__block__' in skeleton:
+            return blocks[skeleton['__block__']]
+        if '__masked__' in skeleton:
+            return np.ma.MaskedArray(blocks[skeleton['__masked__']],
+                                     mask=blocks[skeleton['__mask__']], copy=False)
+        return dict((key, join_arrays(value, blocks)) for key, value in skeleton.items())
+    if isinstance(skeleton, list):
+        return [join_arrays(value, blocks) for value in skeleton]
+    return skeleton
+
+def write_container(filename, header, blocks):
+    """
+    DESCRIPTION: Writes a JSON header followed by 64-byte aligned raw array blocks.
+
+    INPUTS:
+    filename = The full path + name of the file.
+    header = JSON-serializable dictionary. The block layout is added under the 'blocks' key.
+    blocks = List of arrays to write after the header.
+
+    OUTPUTS:
+    The saved file.
+    """
+    layout = []
+    offset = 0
+    for block in blocks:
+        layout.append({'dtype': block.dtype.str, 'shape': list(block.shape), 'offset': offset})
+        offset += _aligned(block.nbytes)
+    header = dict(header, blocks=layout)
+    header_bytes = json.dumps(header, default=_json_default).encode('utf-8')
+    data_start = _aligned(len(MAGIC) + 8 + len(header_bytes))
+
+    tmpname = filename + '.tmp%d' % os.getpid()
+    with open(tmpname, 'wb') as output:
+        output.write(MAGIC)
+        output.write(struct.pack('<Q', len(header_bytes)))
+        output.write(header_bytes)
+        output.write(b'\0' * (data_start - output.tell()))
+        for block, entry in zip(blocks, layout):
+            output.write(np.ascontiguousarray(block).tobytes())
+            output.write(b'\0' * (data_start + entry['offset'] + _aligned(block.nbytes) - output.tell()))
+    os.replace(tmpname, filename)
+
+def read_container(filename, mmap=True):
+    """
+    DESCRIPTION: Reads a file written by write_container.
+
+    INPUTS:
+    filename = The full path to the file.
+
+    OPTIONAL INPUTS:
+    mmap = Default set to True. If True, blocks are copy-on-write views into a memory map of the
+        file. If False, the whole file is read into memory.
+
+    OUTPUTS:
+    header = The header dictionary.
+    blocks = List of arrays.
+    """
+    with open(filename, 'rb') as infile:
+        if infile.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a radar cache file: %s' % filename)
+        header_length = struct.unpack('<Q', infile.read(8))[0]
+        header = json.loads(infile.read(header_length).decode('utf-8'))
+    data_start = _aligned(len(MAGIC) + 8 + header_length)
+
+    if mmap:
+        buf = np.memmap(filename, dtype=np.uint8, mode='c')
+    else:
+        buf = np.fromfile(filename, dtype=np.uint8)
+    blocks = []
+    for entry in header['blocks']:
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        start = data_start + entry['offset']
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        blocks.append(buf[start:start + nbytes].view(dtype).reshape(shape))
+    return header, blocks
+
+def _aligned(nbytes):
+    """
+    DESCRIPTION: Rounds a byte count up to the next multiple of ALIGNMENT.
+    """
+    return -(-nbytes // ALIGNMENT) * ALIGNMENT
+
+def _json_default(obj):
+    """
+    DESCRIPTION: Converts numpy scalars and byte strings found in radar metadata for json.dumps.
+    """
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8', 'replace')
+    raise TypeError('Cannot store %r in a radar cache header' % (obj,))
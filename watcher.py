@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Watches a directory for new radar files so start_script.py can run as a long-lived
+real-time processor instead of being rerun by hand. Uses lightweight polling with os.scandir, which
+works the same on Windows and Linux, and only hands off a file once its size and modification time
+have stopped changing (i.e. the radar or the transfer has finished writing it).
+Contains:
+    watch
+
+Version date: 10/19/2026
+"""
+
+import fnmatch
+import os
+import time
+
+def watch(inpath, wildcard, poll_interval=2, settle_time=5, process_existing=True):
+    """
+    DESCRIPTION: Generator that yields the names of new, complete files in inpath that contain the
+        wildcard. A file replaced under the same name is yielded again. Runs until interrupted.
+
+    INPUTS:
+    inpath = A string that specifies the path to watch.
+    wildcard = A string that sets the phrase which is common to all desired files. Same matching
+        as gen_fun.get_filelist.
+
+    OPTIONAL INPUTS:
+    poll_interval = Default set to 2. Seconds between directory scans.
+    settle_time = Default set to 5. Seconds a file's size and modification time must stay unchanged
+        before it is considered complete.
+    process_existing = Default set to True. If False, files already in inpath when watching starts
+        are ignored.
+
+    OUTPUTS:
+    filename = Name of a complete file (not the full path), yielded in sorted order per scan.
+    """
+    seen = set() #(filename, size, mtime) of the files already handed off
+    if not process_existing:
+        seen.update((filename,) + signature for filename, signature in _scan(inpath, wildcard).items())
+    pending = {} #filename: ((size, mtime), time the signature was first observed)
+
+    while True:
+        now = time.time()
+        ready = []
+        found = _scan(inpath, wildcard)
+        # Forget files that were deleted or replaced, so both stay as small as the directory listing.
+        # A file replaced under the same name has a new signature, so it is processed again.
+        seen.intersection_update((filename,) + signature for filename, signature in found.items())
+        for filename in [filename for filename in pending if filename not in found]:
+            del pending[filename]
+        for filename, signature in found.items():
+            if (filename,) + signature in seen:
+                continue
+            previous = pending.get(filename)
+            if previous is None or previous[0] != signature:
+                pending[filename] = (signature, now)
+            elif now - previous[1] >= settle_time:
+                del pending[filename]
+                seen.add((filename,) + signature)
+                ready.append(filename)
+
+        for filename in sorted(ready):
+            yield filename
+        time.sleep(poll_interval)
+
+def _scan(inpath, wildcard):
+    """
+    DESCRIPTION: Returns a dictionary of {filename: (size, mtime)} for the files in inpath that
+    contain the wildcard, matched as in file_index.query (glob characters allowed, hidden files skipped).
+    """
+    found = {}
+    pattern = '*' + wildcard + '*'
+    for entry in os.scandir(inpath):
+        if not entry.name.startswith('.') and fnmatch.fnmatch(entry.name, pattern) and entry.is_file():
+            stat = entry.stat()
+            found[entry.name] = (stat.st_size, stat.st_mtime)
+    return found
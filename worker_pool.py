@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Oct 19 2026
+
+DESCRIPTION: Long-lived worker processes for start_script.py. Starting a fresh process for every
+file means re-importing PyART, matplotlib, and scipy and rebuilding the colormaps each
+time, which takes longer than processing a small file. Workers in this pool import and initialize
+everything once and receive the run settings (one run_config.RunConfig per radar profile) once, then
+process many files, each job carrying only a filename and its radar type. Each worker is replaced after a set number of files so
+that Python's memory use cannot grow without bound over a long run.
+Contains:
+    init_worker
+    make_pool
+    run_job
+
+Version date: 10/19/2026
+"""
+
+import traceback
+from multiprocessing import Pool
+
+_CONFIGS = {} #Run settings of this worker by radar type, set by init_worker
+
+def init_worker(configs=None):
+    """
+    DESCRIPTION: Runs once when each worker starts. Imports the heavy modules used by run_fun and
+        Master_plotter and initializes matplotlib so that none of this happens per file.
+
+    OPTIONAL INPUTS:
+    configs = Default set to None. Dictionary of the run_config.RunConfig for each radar type.
+    """
+    global _CONFIGS
+    _CONFIGS = configs or {}
+    import scipy.ndimage
+    import pyart
+    from matplotlib import pyplot as plt
+    import colormap
+    import run_fun
+
+    plt.switch_backend('Agg') #Workers only save figures, no GUI backend needed
+    colormap.cuckoo()
+
+def make_pool(workers=1, files_per_worker=25, configs=None):
+    """
+    DESCRIPTION: Creates the pool of warm workers.
+
+    OPTIONAL INPUTS:
+    workers = Default set to 1. Number of files processed at once.
+    files_per_worker = Default set to 25. Number of files each worker processes before it is
+        replaced by a fresh one. Set to None to never recycle workers.
+    configs = Default set to None. Dictionary of the run_config.RunConfig for each radar type, sent
+        to each worker when it starts.
+
+    OUTPUTS:
+    pool = multiprocessing Pool
+    """
+    pool = Pool(processes=workers, initializer=init_worker, initargs=(configs,), maxtasksperchild=files_per_worker)
+    return pool
+
+def run_job(job):
+    """
+    DESCRIPTION: Processes one file in a worker, using the settings the worker was started with.
+
+    INPUTS:
+    job = Tuple of the name of the file in the configured inpath and its radar type
+        (see radar_profiles.detect).
+
+    OUTPUTS:
+    filename = The processed file. Errors are printed rather than raised, so one bad file does
+        not stop the rest of the job.
+    """
+    import run_fun
+    filename, radar_type = job
+    try:
+        run_fun.parse_filelist(filename, _CONFIGS[radar_type])
+    except Exception:
+        print("Error while processing %s" % filename)
+        traceback.print_exc()
+    return filename